@@ -0,0 +1,308 @@
+"""Alarm engine evaluated over the telemetry history.
+
+Rules look at windows of ``history.ChannelBuffer`` samples with NumPy
+operations rather than Python loops per sample. Threshold rules, the most
+numerous kind, are compiled per channel into arrays of limits so all of a
+channel's thresholds are checked against the new samples in one broadcast.
+
+A rule's condition must hold for ``debounce`` seconds before its alarm is
+raised. Raised alarms latch: they stay shown until acknowledged, even if
+the condition clears. Each raise records its latency, the time from the
+first sample that crossed the limit to the alarm (minus the debounce),
+and a latency above ``max_latency`` is reported.
+"""
+import time
+
+import numpy as np
+
+# Alarm states
+INACTIVE = "inactive"
+ACTIVE = "active"  # Condition holds and the alarm has been raised
+LATCHED = "latched"  # Condition cleared but the alarm was not acknowledged yet
+
+
+class AlarmRule:
+    """Base class: ``name`` is shown on the Alarm button."""
+
+    def __init__(self, name, debounce=0.0):
+        self.name = name
+        self.debounce = debounce
+
+    def channels(self):
+        return ()
+
+    def condition(self, history, now):
+        """Return the onset time if the condition holds now, else None."""
+        raise NotImplementedError
+
+
+class ThresholdRule(AlarmRule):
+    """The newest sample of ``channel`` is below ``low`` or above ``high``.
+
+    ``AlarmEngine`` checks the threshold rules of a channel together (see
+    ``_ThresholdGroup``); ``condition`` gives the same answer for one rule.
+    """
+
+    def __init__(self, name, channel, low=None, high=None, debounce=0.0):
+        super(ThresholdRule, self).__init__(name, debounce)
+        self.channel = channel
+        self.low = -np.inf if low is None else low
+        self.high = np.inf if high is None else high
+
+    def channels(self):
+        return (self.channel,)
+
+    def condition(self, history, now):
+        times, values = history.channel(self.channel).last()
+        inside = (values >= self.low) & (values <= self.high)
+        if not len(times) or inside[-1]:
+            return None
+        # Start of the run of out-of-range samples at the end
+        return times[len(inside) - np.argmax(inside[::-1])] if inside.any() else times[0]
+
+
+class RateRule(AlarmRule):
+    """``channel`` changes faster than ``max_rate`` units per second over ``window`` seconds.
+
+    ``direction`` is ``"falling"`` or ``"rising"`` to only alarm on changes
+    that way, or None for either.
+    """
+
+    def __init__(self, name, channel, max_rate, window=5.0, debounce=0.0, direction=None):
+        super(RateRule, self).__init__(name, debounce)
+        if direction not in (None, "falling", "rising"):
+            raise ValueError(f"Unknown rate direction {direction!r}, expected 'falling', 'rising' or None")
+        self.channel = channel
+        self.max_rate = max_rate
+        self.window = window
+        self.direction = direction
+
+    def channels(self):
+        return (self.channel,)
+
+    def condition(self, history, now):
+        times, values = history.window(self.channel, self.window, now)
+        if len(times) < 3 or times[-1] == times[0]:
+            return None
+        # Least-squares slope over the window
+        t = times - times.mean()
+        slope = np.dot(t, values - values.mean()) / np.dot(t, t)
+        if self.direction == "falling":
+            slope = -slope
+        elif self.direction is None:
+            slope = abs(slope)
+        return times[0] if slope > self.max_rate else None
+
+
+class SustainedRule(AlarmRule):
+    """Every sample of ``channel`` over the last ``duration`` seconds is outside [low, high]."""
+
+    def __init__(self, name, channel, low=None, high=None, duration=60.0):
+        super(SustainedRule, self).__init__(name, 0.0)
+        self.channel = channel
+        self.low = -np.inf if low is None else low
+        self.high = np.inf if high is None else high
+        self.duration = duration
+
+    def channels(self):
+        return (self.channel,)
+
+    def condition(self, history, now):
+        times, values = history.window(self.channel, self.duration, now)
+        if not len(times):
+            return None
+        outside = (values < self.low) | (values > self.high)
+        # The window must actually span the duration (no gap at its start)
+        buffer = history.channel(self.channel)
+        covered = buffer.count > len(times) or times[0] <= now - self.duration * 0.9
+        return times[0] if covered and outside.all() else None
+
+
+class DeltaRule(AlarmRule):
+    """The mean of ``channel`` minus the mean of ``reference`` over ``window`` seconds is outside [low, high].
+
+    Used across channels, e.g. the inlet-to-outlet SpO2 rise across the
+    oxygenator or the temperature gap across the heat exchanger.
+    """
+
+    def __init__(self, name, channel, reference, low=None, high=None, window=10.0, debounce=0.0):
+        super(DeltaRule, self).__init__(name, debounce)
+        self.channel = channel
+        self.reference = reference
+        self.low = -np.inf if low is None else low
+        self.high = np.inf if high is None else high
+        self.window = window
+
+    def channels(self):
+        return (self.channel, self.reference)
+
+    def condition(self, history, now):
+        times, values = history.window(self.channel, self.window, now)
+        reference_times, reference_values = history.window(self.reference, self.window, now)
+        if not len(times) or not len(reference_times):
+            return None
+        delta = values.mean() - reference_values.mean()
+        if self.low <= delta <= self.high:
+            return None
+        return max(times[0], reference_times[0])
+
+
+class Alarm:
+    """Runtime state of one rule."""
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.state = INACTIVE
+        self.onset = None  # Time the condition started to hold
+        self.raised_at = None
+        self.acknowledged = False
+
+    @property
+    def name(self):
+        return self.rule.name
+
+
+class _ThresholdGroup:
+    """All threshold rules of one channel, evaluated together."""
+
+    def __init__(self, channel, rules):
+        self.channel = channel
+        self.rules = rules
+        self.lows = np.array([rule.low for rule in rules])[:, None]
+        self.highs = np.array([rule.high for rule in rules])[:, None]
+        self.onsets = np.full(len(rules), np.nan)  # Onset of the current out-of-range run
+        self.seen = 0  # buffer.total already evaluated
+
+    def update(self, buffer):
+        """Fold in the new samples; return the onsets of the current out-of-range runs and the excursions.
+
+        An excursion is the onset of a run that started and ended among the
+        new samples (or continued the previous run) and lasted the rule's
+        debounce, None for rules without one; it must raise the alarm even
+        though the value is back in range by now.
+        """
+        new = buffer.total - self.seen
+        self.seen = buffer.total
+        excursions = [None] * len(self.rules)
+        if new <= 0:
+            return self.onsets, excursions
+        times, values = buffer.last(new)
+        outside = (values < self.lows) | (values > self.highs)  # rules x samples
+        n = outside.shape[1]
+        # Index of the last in-range sample of each rule, -1 if all new samples are outside
+        inside_from_end = np.argmax(~outside[:, ::-1], axis=1)
+        any_inside = (~outside).any(axis=1)
+        last_inside = np.where(any_inside, n - 1 - inside_from_end, -1)
+        still_outside = outside[:, -1]
+        run_start = times[np.minimum(last_inside + 1, n - 1)]
+        continuing = still_outside & (last_inside < 0) & ~np.isnan(self.onsets)
+        ended = outside[:, :-1] & ~outside[:, 1:]  # Last samples of runs that ended in the batch
+        for index in np.flatnonzero(ended.any(axis=1)):
+            row = outside[index]
+            starts = np.flatnonzero(row & np.concatenate(([True], ~row[:-1])))
+            for end in np.flatnonzero(ended[index]):
+                start = starts[np.searchsorted(starts, end, side="right") - 1]
+                onset = self.onsets[index] if start == 0 and not np.isnan(self.onsets[index]) else times[start]
+                if times[end] - onset >= self.rules[index].debounce:
+                    excursions[index] = float(onset)
+                    break
+        self.onsets = np.where(still_outside, np.where(continuing, self.onsets, run_start), np.nan)
+        return self.onsets, excursions
+
+
+class AlarmEngine:
+    """Evaluate rules against a ``history.TelemetryHistory`` and track alarm state."""
+
+    def __init__(self, history, rules, max_latency=0.5):
+        self.history = history
+        self.max_latency = max_latency
+        self.alarms = [Alarm(rule) for rule in rules]
+        self.latencies = []  # Seconds from limit crossing (plus debounce) to raise
+        by_channel = {}
+        self._other = []
+        for alarm in self.alarms:
+            if isinstance(alarm.rule, ThresholdRule):
+                by_channel.setdefault(alarm.rule.channel, []).append(alarm)
+            else:
+                self._other.append(alarm)
+        self._groups = [(_ThresholdGroup(channel, [alarm.rule for alarm in alarms]), alarms)
+                        for channel, alarms in by_channel.items()]
+
+    def channels(self):
+        """Names of every channel the rules read."""
+        return {channel for alarm in self.alarms for channel in alarm.rule.channels()}
+
+    def evaluate(self, now=None):
+        """Update every alarm; return the alarms raised or cleared by this call."""
+        if now is None:
+            now = time.monotonic()
+        changed = []
+        for group, alarms in self._groups:
+            onsets, excursions = group.update(self.history.channel(group.channel))
+            for alarm, onset, excursion in zip(alarms, onsets.tolist(), excursions):
+                # An excursion that is already over still raises (and then latches) the alarm
+                raised = excursion is not None and alarm.state != ACTIVE and self._raise(alarm, excursion, now)
+                if self._update(alarm, None if onset != onset else onset, now) or raised:
+                    changed.append(alarm)
+        for alarm in self._other:
+            if self._update(alarm, alarm.rule.condition(self.history, now), now):
+                changed.append(alarm)
+        return changed
+
+    def _update(self, alarm, onset, now):
+        if onset is None:
+            alarm.onset = None
+            if alarm.state == ACTIVE:
+                alarm.state = INACTIVE if alarm.acknowledged else LATCHED
+                return True
+            return False
+        if alarm.onset is None:
+            alarm.onset = onset
+        if alarm.state == ACTIVE or now - alarm.onset < alarm.rule.debounce:
+            return False
+        return self._raise(alarm, alarm.onset, now)
+
+    def _raise(self, alarm, onset, now):
+        alarm.state = ACTIVE
+        alarm.raised_at = now
+        alarm.acknowledged = False
+        latency = now - onset - alarm.rule.debounce
+        self.latencies.append(latency)
+        if latency > self.max_latency:
+            print(f"Alarm {alarm.name} raised {latency:.3f} s after its limit was crossed")
+        return True
+
+    def active(self):
+        """Alarms to show: raised and not cleared, or latched until acknowledged."""
+        return [alarm for alarm in self.alarms
+                if alarm.state == LATCHED or (alarm.state == ACTIVE and not alarm.acknowledged)]
+
+    def acknowledge(self):
+        """Acknowledge everything shown: latched alarms clear, active ones stay silenced."""
+        for alarm in self.alarms:
+            if alarm.state == LATCHED:
+                alarm.state = INACTIVE
+            elif alarm.state == ACTIVE:
+                alarm.acknowledged = True
+
+
+# Default limits for an adult VA-ECMO run; adjust per patient
+DEFAULT_ALARM_RULES = (
+    ThresholdRule("SpO2 outlet low", "oxygen_saturation_outlet", low=90.0, debounce=5.0),
+    ThresholdRule("SpO2 inlet low", "oxygen_saturation_inlet", low=50.0, debounce=10.0),
+    ThresholdRule("Outlet temp high", "temperature2", high=39.0, debounce=5.0),
+    ThresholdRule("Outlet temp low", "temperature2", low=34.0, debounce=5.0),
+    ThresholdRule("CO2 outlet high", "co2_outlet", high=8.0, debounce=10.0),
+    ThresholdRule("Blood flow low", "blood_flow_rate", low=1.0, debounce=3.0),
+    ThresholdRule("Blood flow high", "blood_flow_rate", high=7.0, debounce=3.0),
+    RateRule("Blood flow dropping", "blood_flow_rate", max_rate=0.5, window=5.0, debounce=2.0,
+             direction="falling"),
+    SustainedRule("Outlet temp out of range", "temperature2", low=35.5, high=38.5, duration=60.0),
+    DeltaRule("Oxygenator SpO2 rise low", "oxygen_saturation_outlet", "oxygen_saturation_inlet",
+              low=10.0, window=10.0, debounce=10.0),
+    # Link state recorded by the GUI: 1 while a board is connected, 0 while it reconnects
+    ThresholdRule("Sensor board disconnected", "link:sensor", low=0.5, debounce=2.0),
+    ThresholdRule("Pump board disconnected", "link:pump", low=0.5, debounce=2.0),
+    DeltaRule("Heat exchanger gap", "temperature2", "temperature1", low=-2.0, high=2.0,
+              window=10.0, debounce=10.0),
+)
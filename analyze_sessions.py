@@ -0,0 +1,236 @@
+"""Summarize recorded ECMO sessions after the procedure.
+
+Run ``python analyze_sessions.py sessions/ --output reports``. Every
+``.ecmolog`` file given (or found under a given directory) is opened with
+``numpy.memmap`` through ``recorder.SessionLog`` and analyzed on its own
+process, so an archive of many runs uses every core. These tables are
+written, as CSV or, with ``--format parquet``, Parquet (needs ``pyarrow``):
+
+* ``sessions``: start, duration, records, alarms and setpoint changes of each run,
+* ``stats``: count, mean, standard deviation, min, percentiles and max of
+  every channel, for the raw, filtered and derived values,
+* ``time_in_range``: seconds below, within and above each channel's range
+  (by default the alarm limits, the narrowest band the rules allow;
+  override with ``--range temperature2=35.5:38.5``), holding each sample
+  until the next one but for at most ``--max-hold`` seconds,
+* ``alarms``: when each alarm was raised and cleared,
+* ``setpoints``: every setpoint change made with the +/- buttons.
+"""
+import argparse
+import csv
+import datetime
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from alarms import DEFAULT_ALARM_RULES, ThresholdRule, SustainedRule
+from recorder import SessionLog, SAMPLE, COMMAND, ALARM, FILTERED, DERIVED, SESSION_SUFFIX
+
+VALUE_KINDS = {SAMPLE: "raw", FILTERED: "filtered", DERIVED: "derived"}
+PERCENTILES = (5, 50, 95)
+MAX_HOLD = 5.0  # Seconds a sample counts for at most; longer gaps are missing data
+
+
+def alarm_ranges(rules=DEFAULT_ALARM_RULES):
+    """Channel -> (low, high): the narrowest band the threshold rules allow."""
+    ranges = {}
+    for rule in rules:
+        if not isinstance(rule, (ThresholdRule, SustainedRule)) or ":" in rule.channel:
+            continue
+        low, high = ranges.get(rule.channel, (-math.inf, math.inf))
+        ranges[rule.channel] = (max(low, float(rule.low)), min(high, float(rule.high)))
+    return ranges
+
+
+def parse_range(text):
+    """Parse ``channel=low:high`` (either limit may be left out)."""
+    channel, _, limits = text.partition("=")
+    low, _, high = limits.partition(":")
+    return channel, (float(low) if low else -math.inf, float(high) if high else math.inf)
+
+
+def find_sessions(paths):
+    """Expand directories into the session logs they contain, oldest name first."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                found.extend(os.path.join(directory, name) for name in names if name.endswith(SESSION_SUFFIX))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def iso(log, timestamp):
+    wall = log.wall_time(timestamp)
+    return datetime.datetime.fromtimestamp(wall).isoformat(timespec="seconds")
+
+
+def channel_groups(records):
+    """Split ``records`` by channel: yield (channel id, records sorted by time)."""
+    order = np.lexsort((records["time"], records["channel"]))
+    ordered = records[order]
+    starts = np.flatnonzero(np.diff(ordered["channel"])) + 1
+    for group in np.split(ordered, starts):
+        if len(group):
+            yield int(group["channel"][0]), group
+
+
+def value_stats(log, session):
+    rows = []
+    records = log.records
+    for kind, kind_name in VALUE_KINDS.items():
+        selected = records[(records["kind"] == kind) & np.isfinite(records["value"])]
+        for channel_id, group in channel_groups(selected):
+            name = log.channels[channel_id]
+            if name.startswith("link:"):
+                continue
+            values = np.sort(group["value"])
+            row = {"session": session, "channel": name, "kind": kind_name, "count": len(values),
+                   "mean": float(values.mean()), "std": float(values.std()), "min": float(values[0])}
+            for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                row[f"p{percentile}"] = float(value)
+            row["max"] = float(values[-1])
+            row["first"] = iso(log, group["time"][0])
+            row["last"] = iso(log, group["time"][-1])
+            rows.append(row)
+    return rows
+
+
+def time_in_range(log, session, ranges, max_hold):
+    """Seconds each ranged channel spent below, within and above its range (filtered values if recorded)."""
+    rows = []
+    records = log.records
+    for kind in (FILTERED, SAMPLE, DERIVED):
+        selected = records[records["kind"] == kind]
+        for channel_id, group in channel_groups(selected):
+            name = log.channels[channel_id]
+            if name not in ranges or any(row["channel"] == name for row in rows):
+                continue  # Filtered values win over raw ones
+            low, high = ranges[name]
+            held = np.minimum(np.diff(group["time"], append=group["time"][-1]), max_hold)
+            values = group["value"]
+            finite = np.isfinite(values)
+            below = float(held[finite & (values < low)].sum())
+            above = float(held[finite & (values > high)].sum())
+            total = float(held[finite].sum())
+            rows.append({"session": session, "channel": name, "kind": VALUE_KINDS[kind], "low": low,
+                         "high": high, "seconds": total, "below_s": below, "in_range_s": total - below - above,
+                         "above_s": above, "in_range": (total - below - above) / total if total else None})
+    return rows
+
+
+def alarm_timeline(log, session):
+    rows = []
+    events = log.records[log.records["kind"] == ALARM]
+    open_alarms = {}  # Name -> row of the raise not cleared yet
+    for event in events[np.argsort(events["time"], kind="stable")]:
+        name = log.channels[event["channel"]].partition("alarm:")[2]
+        if event["value"] >= 0.5:
+            if name not in open_alarms:
+                row = {"session": session, "alarm": name, "raised": iso(log, event["time"]),
+                       "cleared": None, "duration_s": None, "_time": float(event["time"])}
+                open_alarms[name] = row
+                rows.append(row)
+        elif name in open_alarms:
+            row = open_alarms.pop(name)
+            row["cleared"] = iso(log, event["time"])
+            row["duration_s"] = float(event["time"]) - row["_time"]
+    for row in rows:
+        del row["_time"]
+    return rows
+
+
+def setpoint_history(log, session):
+    rows = []
+    commands = log.records[log.records["kind"] == COMMAND]
+    previous = {}
+    for command in commands[np.argsort(commands["time"], kind="stable")]:
+        name = log.channels[command["channel"]]
+        value = float(command["value"])
+        rows.append({"session": session, "time": iso(log, command["time"]), "setpoint": name, "value": value,
+                     "change": value - previous[name] if name in previous else None})
+        previous[name] = value
+    return rows
+
+
+def analyze_session(path, ranges=None, max_hold=MAX_HOLD):
+    """Analyze one session log; runs on a worker process and returns plain tables."""
+    ranges = alarm_ranges() if ranges is None else ranges
+    log = SessionLog(path)
+    session = os.path.basename(path)
+    times = log.records["time"]
+    summary = {"session": session, "started": log.header["started"], "records": len(log),
+               "duration_s": float(times.max() - times.min()) if len(times) else 0.0}
+    return {
+        "summary": summary,
+        "stats": value_stats(log, session),
+        "time_in_range": time_in_range(log, session, ranges, max_hold),
+        "alarms": alarm_timeline(log, session),
+        "setpoints": setpoint_history(log, session),
+    }
+
+
+def write_table(rows, path, file_format):
+    if file_format == "parquet":
+        import pyarrow
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), path)
+        return
+    with open(path, "w", newline="") as output:
+        fields = list(dict.fromkeys(field for row in rows for field in row))
+        writer = csv.DictWriter(output, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="session logs or directories of them")
+    parser.add_argument("--output", default="reports", help="directory for the tables")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--range", action="append", default=[], type=parse_range, metavar="CHANNEL=LOW:HIGH",
+                        help="time-in-range band of a channel (default: the alarm limits)")
+    parser.add_argument("--max-hold", type=float, default=MAX_HOLD,
+                        help="seconds a sample counts for at most in time-in-range")
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        try:
+            import pyarrow.parquet  # Fail before the analysis rather than after it
+        except ImportError:
+            sys.exit("Parquet output needs pyarrow (pip install pyarrow), or use --format csv")
+    paths = find_sessions(args.paths)
+    if not paths:
+        sys.exit("No session logs found")
+    ranges = dict(alarm_ranges(), **dict(args.range))
+    start = time.perf_counter()
+    tables = {"sessions": [], "stats": [], "time_in_range": [], "alarms": [], "setpoints": []}
+    with ProcessPoolExecutor(max_workers=min(args.jobs, len(paths))) as pool:
+        results = pool.map(analyze_session, paths, [ranges] * len(paths), [args.max_hold] * len(paths))
+        for path, result in zip(paths, results):
+            summary = result.pop("summary")
+            summary["alarms"] = len(result["alarms"])
+            summary["setpoint_changes"] = len(result["setpoints"])
+            tables["sessions"].append(summary)
+            for name, rows in result.items():
+                tables[name].extend(rows)
+            print(f"{summary['session']}: {summary['duration_s'] / 3600:.1f} h, {summary['records']} records, "
+                  f"{summary['alarms']} alarms, {summary['setpoint_changes']} setpoint changes")
+
+    os.makedirs(args.output, exist_ok=True)
+    for name, rows in tables.items():
+        if rows:
+            write_table(rows, os.path.join(args.output, f"{name}.{args.format}"), args.format)
+    records = sum(summary["records"] for summary in tables["sessions"])
+    print(f"{len(paths)} sessions, {records} records analyzed in {time.perf_counter() - start:.1f} s, "
+          f"tables in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Throughput and latency benchmark of the ingestion-to-display pipeline.
+
+Drives a real ``MainPage`` from test1101.py with sensor records at rising
+rates and measures, per rate:
+
+* parse cost per record (time spent in the sensor link's codec),
+* bus queue depth (batches) seen by each UI update and dropped records,
+* label update cost (``display.update`` plus the display flush),
+* sensor-to-pixel latency: from the moment a record is written to the
+  port until a frame showing it has been drawn.
+
+Each record carries its sequence number in ``temperature1`` so the value on
+screen identifies the record being shown. The sensor board is an in-memory
+``LoopbackArduino`` or, with ``--pty``, a pseudo-terminal pair opened with
+pyserial like the real ``/dev/ttyACM*`` device.
+
+No display is needed: ``KIVY_GL_BACKEND=mock`` is set unless already
+configured, so run it under any window provider, e.g.
+``xvfb-run python bench_pipeline.py``. Results are written as JSON; with
+``--baseline`` the run fails if throughput or p95 latency regress.
+"""
+import os
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+os.environ.setdefault("KIVY_GL_BACKEND", "mock")
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import serial
+from kivy.base import EventLoop
+
+import test1101
+from loopback import LoopbackArduino
+from telemetry import SENSOR_FIELDS, format_sensor_line
+
+DEFAULT_RATES = (1, 10, 100, 1000)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class PtyBoard:
+    """Sensor board behind a pseudo-terminal, read by pyserial like the real port."""
+
+    def __init__(self):
+        self.master, slave = os.openpty()
+        self.connection = serial.Serial(os.ttyname(slave), baudrate=9600, timeout=1)
+        os.close(slave)
+
+    def send(self, record):
+        os.write(self.master, format_sensor_line(record).encode('utf-8'))
+
+    def close(self):
+        self.connection.close()
+        os.close(self.master)
+
+
+class MemoryBoard:
+    """Sensor board emulated in memory."""
+
+    def __init__(self):
+        self.connection = LoopbackArduino("sensor", timeout=1)
+
+    def send(self, record):
+        self.connection.send(record)
+
+    def close(self):
+        self.connection.close()
+
+
+def feed(board, rate, duration, sent_at, stop):
+    """Write one record per period, catching up in bursts if the thread falls behind."""
+    period = 1.0 / rate
+    start = time.perf_counter()
+    sequence = 0
+    while not stop.is_set():
+        due = start + sequence * period
+        now = time.perf_counter()
+        if due - start >= duration:
+            return
+        if due > now:
+            time.sleep(due - now)
+        record = dict.fromkeys(SENSOR_FIELDS, 0.0)
+        record["temperature1"] = float(sequence)
+        sent_at[sequence] = time.perf_counter()
+        board.send(record)
+        sequence += 1
+
+
+def run_rate(rate, duration, use_pty):
+    board = PtyBoard() if use_pty else MemoryBoard()
+    pump = LoopbackArduino("pump", timeout=1)
+    page = test1101.MainPage(connections={"sensor": board.connection, "pump": pump})
+    page.start()
+    link = page.io_loop.links["sensor"]
+    link.connected.wait()
+
+    stats = {"parse_time": 0.0, "parsed": 0, "label_time": 0.0, "label_updates": 0,
+             "queue_depths": [], "consumed": 0}
+
+    codec_feed = link.codec.feed
+
+    def timed_feed(data):
+        start = time.perf_counter()
+        records = codec_feed(data)
+        stats["parse_time"] += time.perf_counter() - start
+        stats["parsed"] += len(records)
+        return records
+    link.codec.feed = timed_feed
+
+    update_from_serial = page.update_from_serial
+
+    def sampled_update(dt):
+        stats["queue_depths"].append(page.bus.pending)
+        update_from_serial(dt)
+    page.update_from_serial = sampled_update
+
+    display_update = page.display.update
+
+    def timed_display_update(values):
+        # Flush right away so the cost of the label texts is included
+        start = time.perf_counter()
+        display_update(values)
+        page.display.flush()
+        stats["label_time"] += time.perf_counter() - start
+        stats["label_updates"] += 1
+    page.display.update = timed_display_update
+
+    def count(records):
+        stats["consumed"] += len(records)
+    page.bus.subscribe(count, devices=("sensor",))
+
+    sent_at = {}
+    latencies = []
+    shown = None
+    stop = threading.Event()
+    feeder = threading.Thread(target=feed, args=(board, rate, duration, sent_at, stop), daemon=True)
+    start = time.perf_counter()
+    feeder.start()
+    # Keep drawing frames until everything sent has been shown, or give up
+    deadline = start + duration + 2
+    while time.perf_counter() < deadline:
+        EventLoop.idle()
+        sequence = int(float(page.value_labels["temperature1"].text.split()[-1]))
+        if sequence != shown and sequence in sent_at:
+            latencies.append(time.perf_counter() - sent_at[sequence])
+            shown = sequence
+        if not feeder.is_alive() and shown == len(sent_at) - 1:
+            break
+    elapsed = time.perf_counter() - start
+    stop.set()
+    feeder.join()
+    page.on_stop()
+    board.close()
+
+    sent = len(sent_at)
+    return {
+        "rate_hz": rate,
+        "transport": "pty" if use_pty else "memory",
+        "sent": sent,
+        "consumed": stats["consumed"],
+        "dropped": sent - stats["consumed"],
+        "bus_dropped": page.bus.dropped,
+        "throughput_hz": stats["consumed"] / elapsed,
+        "parse_us_per_record": stats["parse_time"] / max(1, stats["parsed"]) * 1e6,
+        "queue_depth_max": max(stats["queue_depths"], default=0),
+        "queue_depth_mean": statistics.fmean(stats["queue_depths"]) if stats["queue_depths"] else 0,
+        "ui_updates": stats["label_updates"],
+        "label_update_us": stats["label_time"] / max(1, stats["label_updates"]) * 1e6,
+        "latency_ms_p50": (percentile(latencies, 0.5) or 0) * 1e3,
+        "latency_ms_p95": (percentile(latencies, 0.95) or 0) * 1e3,
+        "latency_ms_max": max(latencies, default=0) * 1e3,
+    }
+
+
+def check_baseline(results, baseline_path, tolerance):
+    """Return a list of regressions against a previous results file."""
+    with open(baseline_path) as baseline_file:
+        baseline = {(r["rate_hz"], r["transport"]): r for r in json.load(baseline_file)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["rate_hz"], result["transport"]))
+        if previous is None:
+            continue
+        if result["throughput_hz"] < previous["throughput_hz"] * (1 - tolerance):
+            regressions.append(f"{result['rate_hz']} Hz: throughput {result['throughput_hz']:.1f} Hz "
+                               f"< baseline {previous['throughput_hz']:.1f} Hz")
+        if result["latency_ms_p95"] > previous["latency_ms_p95"] * (1 + tolerance) + 1.0:
+            regressions.append(f"{result['rate_hz']} Hz: p95 latency {result['latency_ms_p95']:.1f} ms "
+                               f"> baseline {previous['latency_ms_p95']:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", type=float, nargs="+", default=DEFAULT_RATES, help="sample rates in Hz")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run each rate")
+    parser.add_argument("--pty", action="store_true", help="feed through a pseudo-terminal pair")
+    parser.add_argument("--output", default="bench_pipeline.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    test1101.SESSION_DIR = tempfile.mkdtemp(prefix="ecmo-bench-")
+    # Displayed values must be the sequence numbers sent, so no filtering
+    test1101.SIGNAL_FILTERS = {}
+    EventLoop.ensure_window()
+
+    results = []
+    print(f"{'rate':>6}{'sent':>8}{'dropped':>9}{'parse us':>10}{'queue max':>11}{'labels us':>11}"
+          f"{'p50 ms':>9}{'p95 ms':>9}")
+    for rate in args.rates:
+        result = run_rate(rate, args.duration, args.pty)
+        results.append(result)
+        print(f"{rate:>6g}{result['sent']:>8}{result['dropped']:>9}{result['parse_us_per_record']:>10.1f}"
+              f"{result['queue_depth_max']:>11}{result['label_update_us']:>11.1f}"
+              f"{result['latency_ms_p50']:>9.1f}{result['latency_ms_p95']:>9.1f}")
+
+    with open(args.output, "w") as output:
+        json.dump({"created": time.time(), "duration_s": args.duration, "results": results}, output, indent=2)
+
+    unmeasured = [result["rate_hz"] for result in results if not result["ui_updates"]]
+    if unmeasured:
+        print(f"No label updates measured at {', '.join(f'{rate:g} Hz' for rate in unmeasured)}")
+        sys.exit(1)
+
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
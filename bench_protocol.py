@@ -0,0 +1,97 @@
+"""Compare the text (CSV / BFR:) and binary framed protocols without hardware.
+
+Run with ``python bench_protocol.py``. Both codecs decode the same random
+sensor records, fed in serial-sized chunks; the best of ``--repeat`` runs
+is reported, so one-time costs such as warming up caches are left out.
+The round trip through a ``LoopbackArduino`` and the ``SerialIOLoop``
+(negotiation included) is checked for each protocol.
+"""
+import argparse
+import random
+import time
+
+from binary_protocol import BinaryCodec, SENSOR_FRAME, negotiate_binary
+from bus import EventBus
+from devices import DeviceSpec
+from io_loop import SerialIOLoop, DeviceLink
+from loopback import LoopbackArduino
+from telemetry import SENSOR_FIELDS, TextCodec, parse_sensor_line, format_sensor_line
+
+
+def random_records(count, seed=0):
+    rng = random.Random(seed)
+    return [{name: round(rng.uniform(0, 100), 2) for name in SENSOR_FIELDS} for _ in range(count)]
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def time_decode(codec, chunks):
+    start = time.perf_counter()
+    records = []
+    for chunk in chunks:
+        records.extend(codec.feed(chunk))
+    return time.perf_counter() - start, records
+
+
+def check_round_trip(records, binary_capable):
+    """Send records through the loopback firmware and the I/O loop."""
+    port = LoopbackArduino("sensor", binary_capable=binary_capable, timeout=0.05)
+    bus = EventBus()
+    received = []
+    bus.subscribe(received.extend)
+    io_loop = SerialIOLoop(bus)
+    link = DeviceLink(DeviceSpec("sensor", "sensor", "loopback"), TextCodec(parse_sensor_line),
+                      negotiate=negotiate_binary)
+    io_loop.add(link, port)
+    io_loop.start()
+    # Wait for negotiation to finish before sending so nothing is discarded
+    link.connected.wait(2)
+    port.send(*records)
+    deadline = time.monotonic() + 2
+    while len(received) < len(records) and time.monotonic() < deadline:
+        time.sleep(0.01)
+        bus.dispatch()
+    io_loop.stop()
+    io_loop.join()
+    ok = len(received) == len(records) and all(
+        abs(got[name] - sent[name]) < 0.006 for got, sent in zip(received, records) for name in SENSOR_FIELDS)
+    return link.codec.name, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000, help="number of sensor records to decode")
+    parser.add_argument("--chunk", type=int, default=64, help="bytes per simulated serial read")
+    parser.add_argument("--repeat", type=int, default=3, help="decode runs per codec, the fastest is reported")
+    args = parser.parse_args()
+
+    records = random_records(args.records)
+    text_data = "".join(format_sensor_line(record) for record in records).encode('utf-8')
+    encoder = BinaryCodec()
+    binary_data = b"".join(encoder.encode(SENSOR_FRAME, record) for record in records)
+
+    print(f"{'codec':<8}{'bytes/rec':>10}{'max rec/s @9600':>17}{'@115200':>10}{'decode us/rec':>15}")
+    for name, codec, data in (("text", TextCodec(parse_sensor_line), text_data),
+                              ("binary", BinaryCodec(), binary_data)):
+        chunks = chunked(data, args.chunk)
+        elapsed, decoded = time_decode(codec, chunks)
+        for _ in range(args.repeat - 1):
+            codec.reset()
+            elapsed = min(elapsed, time_decode(codec, chunks)[0])
+        assert len(decoded) == len(records), f"{name}: decoded {len(decoded)} of {len(records)} records"
+        per_record = len(data) / len(records)
+        # 8N1 framing puts 10 bits on the wire per byte
+        print(f"{name:<8}{per_record:>10.1f}{9600 / 10 / per_record:>17.0f}{115200 / 10 / per_record:>10.0f}"
+              f"{elapsed / len(records) * 1e6:>15.2f}")
+
+    sample = records[:200]
+    for binary_capable in (True, False):
+        codec_name, ok = check_round_trip(sample, binary_capable)
+        firmware = "binary-capable" if binary_capable else "text-only"
+        print(f"loopback {firmware} firmware: negotiated {codec_name}, round trip {'ok' if ok else 'FAILED'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Load test of the telemetry stream with hundreds of simulated monitors.
+
+Run with ``python bench_stream.py --clients 300 --slow 0.2``. The main
+thread plays the UI: it publishes synthetic records at ``--rate`` Hz into
+a ``TelemetryServer`` and times every ``publish`` call. Simulated clients
+connect from another thread; the ``--slow`` fraction of them reads with
+small buffers and pauses ``--slow-pause`` after every message, slower than
+the broadcasts arrive. Reported per run:
+
+* cost of ``publish`` on the UI thread (must stay flat whatever the clients do),
+* messages, full snapshots and skipped broadcasts per fast and slow client,
+* publish-to-client latency of the fast and slow clients.
+
+The run fails unless the slow clients skipped ahead (the server dropped
+their backlog and resynced them) and their p95 latency stayed within
+``--max-slow-latency``.
+
+Each record carries its sequence number in ``sequence``, so a client can
+tell which published record a message shows.
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+from stream_client import StreamState
+from stream_server import TelemetryServer
+from telemetry import SENSOR_FIELDS
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def simulated_client(address, slow, sent_at, results, stop):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if slow:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, address)
+    # A slow client must not buffer ahead either, or it would hide its backlog
+    reader, writer = await asyncio.open_connection(sock=sock, limit=512 if slow else 2 ** 16)
+    state = StreamState()
+    latencies = []
+    try:
+        while not stop.is_set():
+            try:
+                line = await asyncio.wait_for(reader.readline(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                break
+            received = time.monotonic()
+            message = state.apply(line)
+            sequence = message["values"].get("sequence")
+            if sequence in sent_at:
+                latencies.append(received - sent_at[sequence])
+            if slow:
+                await asyncio.sleep(slow)
+    finally:
+        writer.close()
+    results.append((slow, state, latencies))
+
+
+def run_clients(address, count, slow_fraction, slow_pause, sent_at, results, stop):
+    async def main():
+        slow_count = int(count * slow_fraction)
+        tasks = []
+        for index in range(count):
+            tasks.append(asyncio.create_task(
+                simulated_client(address, slow_pause if index < slow_count else 0, sent_at, results, stop)))
+            if index % 50 == 49:
+                await asyncio.sleep(0)  # Let the server accept the backlog
+        await asyncio.gather(*tasks, return_exceptions=True)
+    asyncio.run(main())
+
+
+def summarize(results, slow):
+    group = [(state, latencies) for pause, state, latencies in results if bool(pause) == slow]
+    if not group:
+        return None
+    latencies = [latency for _, client_latencies in group for latency in client_latencies]
+    return {
+        "clients": len(group),
+        "messages_mean": sum(state.messages for state, _ in group) / len(group),
+        "snapshots_mean": sum(state.snapshots for state, _ in group) / len(group),
+        "skipped_mean": sum(state.skipped for state, _ in group) / len(group),
+        "latency_ms_p50": (percentile(latencies, 0.5) or 0) * 1000,
+        "latency_ms_p95": (percentile(latencies, 0.95) or 0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=300, help="simulated monitors")
+    parser.add_argument("--slow", type=float, default=0.2, help="fraction of clients that read slowly")
+    parser.add_argument("--slow-pause", type=float, default=0.2, help="seconds a slow client waits per message")
+    parser.add_argument("--max-slow-latency", type=float, default=3.0,
+                        help="p95 latency (s) the slow clients must stay within")
+    parser.add_argument("--rate", type=float, default=100.0, help="records published per second")
+    parser.add_argument("--interval", type=float, default=0.05, help="server snapshot interval (s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to publish")
+    parser.add_argument("--output", default="bench_stream.json", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    server = TelemetryServer(port=0, interval=args.interval)
+    server.start()
+    server.ready.wait()
+
+    sent_at = {}
+    results = []
+    stop = threading.Event()
+    clients = threading.Thread(target=run_clients,
+                               args=(server.address, args.clients, args.slow, args.slow_pause, sent_at, results, stop),
+                               daemon=True)
+    clients.start()
+    deadline = time.monotonic() + 10
+    while len(server.clients) < args.clients and time.monotonic() < deadline:
+        time.sleep(0.05)
+    print(f"{len(server.clients)} clients connected")
+
+    # The UI thread: publish at a steady rate and time every call
+    rng = random.Random(0)
+    publish_times = []
+    period = 1.0 / args.rate
+    start = time.monotonic()
+    sequence = 0
+    while time.monotonic() - start < args.duration:
+        wait = start + sequence * period - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        record = {name: round(rng.uniform(0, 100), 2) for name in SENSOR_FIELDS}
+        record["sequence"] = float(sequence)
+        sent_at[float(sequence)] = time.monotonic()
+        begin = time.perf_counter()
+        server.publish([record])
+        publish_times.append(time.perf_counter() - begin)
+        sequence += 1
+
+    time.sleep(args.interval * 3)
+    stop.set()
+    clients.join(5)
+    server.stop()
+    server.join(5)
+
+    summary = {
+        "clients": args.clients,
+        "rate_hz": args.rate,
+        "interval_s": args.interval,
+        "published": sequence,
+        "broadcasts": server.seq,
+        "server_dropped": server.dropped,
+        "publish_us_p50": percentile(publish_times, 0.5) * 1e6,
+        "publish_us_p99": percentile(publish_times, 0.99) * 1e6,
+        "publish_us_max": max(publish_times) * 1e6,
+        "fast": summarize(results, False),
+        "slow": summarize(results, True),
+    }
+    print(f"publish on the UI thread: p50 {summary['publish_us_p50']:.1f} us, "
+          f"p99 {summary['publish_us_p99']:.1f} us, max {summary['publish_us_max']:.1f} us")
+    print(f"{server.seq} broadcasts, {server.dropped} messages dropped for slow clients")
+    print(f"{'clients':>12}{'count':>7}{'msgs':>8}{'full':>7}{'skipped':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for name in ("fast", "slow"):
+        group = summary[name]
+        if group:
+            print(f"{name:>12}{group['clients']:>7}{group['messages_mean']:>8.1f}{group['snapshots_mean']:>7.1f}"
+                  f"{group['skipped_mean']:>9.1f}{group['latency_ms_p50']:>9.1f}{group['latency_ms_p95']:>9.1f}")
+    with open(args.output, "w") as output:
+        json.dump({"created": time.time(), "results": summary}, output, indent=2)
+
+    slow = summary["slow"]
+    if slow:
+        failures = []
+        if not slow["skipped_mean"]:
+            failures.append("the slow clients never skipped ahead")
+        if slow["latency_ms_p95"] > args.max_slow_latency * 1000:
+            failures.append(f"slow client p95 latency {slow['latency_ms_p95']:.0f} ms "
+                            f"> {args.max_slow_latency * 1000:.0f} ms")
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Compact binary framing for the Arduino serial links.
+
+Every frame is a fixed-layout little-endian record::
+
+    sync (u16 0xA55A) | frame type (u8) | sequence (u16) | payload | CRC-16 (u16)
+
+The CRC is CRC-16/CCITT (``binascii.crc_hqx``, initial value 0xFFFF) over
+the frame type, sequence and payload. Sensor values travel as int16 in
+hundredths, so a full sensor record is 19 bytes instead of ~30 bytes of
+CSV, and decoding is a single ``struct.unpack_from`` on the receive buffer.
+
+Firmware that supports the binary mode answers the text request ``P:BIN``
+with ``ACK:BIN`` and switches; older firmware ignores it and the link stays
+on the text protocol.
+"""
+import struct
+import time
+from binascii import crc_hqx
+
+from telemetry import SENSOR_FIELDS, PUMP_SPEED_COMMAND, AIR_FLOW_COMMAND
+
+SYNC = 0xA55A
+SYNC_BYTES = struct.pack('<H', SYNC)
+HEADER = struct.Struct('<HBH')  # sync, frame type, sequence
+CRC = struct.Struct('<H')
+CRC_INIT = 0xFFFF
+
+NEGOTIATE_REQUEST = b"P:BIN\n"
+NEGOTIATE_ACK = b"ACK:BIN\n"
+
+
+class FrameSpec:
+    """Layout of one frame type: payload struct, channel names and scale."""
+
+    def __init__(self, frame_type, fmt, fields, scale=1.0):
+        self.frame_type = frame_type
+        self.struct = struct.Struct(fmt)
+        self.fields = tuple(fields)
+        self.scale = scale
+        self.size = HEADER.size + self.struct.size + CRC.size
+        # The whole frame in one struct: sync, type, sequence, payload..., CRC
+        self.frame = struct.Struct(HEADER.format + fmt.lstrip('<') + CRC.format.lstrip('<'))
+
+    def to_record(self, values):
+        if self.scale != 1.0:
+            return dict(zip(self.fields, map(self.scale.__mul__, values)))
+        return dict(zip(self.fields, values))
+
+    def to_payload(self, record):
+        if self.scale != 1.0:
+            return [int(round(record[name] / self.scale)) for name in self.fields]
+        return [record[name] for name in self.fields]
+
+
+# Telemetry frames sent by the Arduinos
+SENSOR_FRAME = FrameSpec(0x01, '<6h', SENSOR_FIELDS, scale=0.01)
+BLOOD_FLOW_FRAME = FrameSpec(0x02, '<h', ("blood_flow_rate",), scale=0.01)
+
+# Setpoint commands sent to the blood pump Arduino
+PUMP_SPEED_FRAME = FrameSpec(0x10, '<f', (PUMP_SPEED_COMMAND,))
+AIR_FLOW_FRAME = FrameSpec(0x11, '<f', (AIR_FLOW_COMMAND,))
+
+# Acknowledgement of a command, carries the command's frame type
+ACK_FRAME = FrameSpec(0x20, '<B', ("frame_type",))
+
+TELEMETRY_FRAMES = (SENSOR_FRAME, BLOOD_FLOW_FRAME)
+COMMAND_FRAMES = (PUMP_SPEED_FRAME, AIR_FLOW_FRAME)
+
+
+class BinaryCodec:
+    """Streaming encoder/decoder for binary frames.
+
+    ``feed`` scans the receive buffer in place: frames are located by the
+    sync word, checked against their CRC and unpacked straight out of the
+    buffer; the consumed prefix is dropped once per call. Command
+    acknowledgements are passed to ``on_ack`` with the command prefix.
+    """
+
+    name = "binary"
+
+    def __init__(self, specs=TELEMETRY_FRAMES, command_specs=COMMAND_FRAMES, on_ack=None):
+        self.specs = {spec.frame_type: spec for spec in specs}
+        self.specs[ACK_FRAME.frame_type] = ACK_FRAME
+        self.commands = {spec.fields[0]: spec for spec in command_specs}
+        self.command_prefixes = {spec.frame_type: spec.fields[0] for spec in command_specs}
+        self.on_ack = on_ack
+        self._buffer = bytearray()
+        self._last_sequence = None
+        self._tx_sequence = 0
+        self.crc_errors = 0
+        self.lost_frames = 0
+
+    def feed(self, data):
+        """Add received bytes and return the list of complete records."""
+        buf = self._buffer
+        buf += data
+        records = []
+        append = records.append
+        find = buf.find
+        specs = self.specs
+        last_sequence = self._last_sequence
+        pos = 0
+        size = len(buf)
+        with memoryview(buf) as view:
+            while True:
+                start = find(SYNC_BYTES, pos)
+                if start < 0:
+                    # Keep a trailing byte that may be the first half of a sync word
+                    pos = max(pos, size - 1)
+                    break
+                if start + HEADER.size > size:
+                    pos = start
+                    break
+                spec = specs.get(buf[start + 2])
+                if spec is None:
+                    pos = start + 1  # Not a frame boundary, keep scanning
+                    continue
+                end = start + spec.size
+                if end > size:
+                    pos = start
+                    break
+                frame = spec.frame.unpack_from(buf, start)
+                if crc_hqx(view[start + 2:end - 2], CRC_INIT) != frame[-1]:
+                    self.crc_errors += 1
+                    pos = start + 1
+                    continue
+                sequence = frame[2]
+                if last_sequence is not None:
+                    self.lost_frames += (sequence - last_sequence - 1) & 0xFFFF
+                last_sequence = sequence
+                pos = end
+                if spec is ACK_FRAME:
+                    prefix = self.command_prefixes.get(frame[3])
+                    if prefix is not None and self.on_ack is not None:
+                        self.on_ack(prefix)
+                    continue
+                append(spec.to_record(frame[3:-1]))
+        self._last_sequence = last_sequence
+        del buf[:pos]
+        return records
+
+    def encode(self, spec, record):
+        """Encode one record as a frame of the given type."""
+        body = struct.pack('<BH', spec.frame_type, self._tx_sequence) + spec.struct.pack(*spec.to_payload(record))
+        self._tx_sequence = (self._tx_sequence + 1) & 0xFFFF
+        return SYNC_BYTES + body + CRC.pack(crc_hqx(body, CRC_INIT))
+
+    def encode_command(self, prefix, value):
+        """Encode a setpoint command (``M`` pump speed, ``F`` air flow) as a frame."""
+        return self.encode(self.commands[prefix], {prefix: value})
+
+    def reset(self):
+        self._buffer.clear()
+        self._last_sequence = None
+
+    def resync(self):
+        """Start again at the next frame; frames are found by their sync word and CRC."""
+        self.reset()
+
+
+def negotiate_binary(connection, specs=TELEMETRY_FRAMES, timeout=1.0, on_ack=None):
+    """Ask the firmware to switch to binary framing.
+
+    Returns a ``BinaryCodec`` if the firmware acknowledged, otherwise None
+    and the link stays on the text protocol. Text lines received while
+    waiting for the acknowledgement are discarded; binary data that follows
+    the acknowledgement in the same read is kept for the codec.
+    """
+    connection.write(NEGOTIATE_REQUEST)
+    connection.flush()
+    received = bytearray()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        received += connection.read(connection.in_waiting or 1)
+        index = received.find(NEGOTIATE_ACK)
+        if index >= 0:
+            codec = BinaryCodec(specs, on_ack=on_ack)
+            codec._buffer += received[index + len(NEGOTIATE_ACK):]
+            return codec
+        del received[:-len(NEGOTIATE_ACK)]
+    return None
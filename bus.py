@@ -0,0 +1,134 @@
+"""In-process publish/subscribe bus between the devices and their consumers.
+
+Devices publish batches of parsed records from the I/O thread; ``publish``
+only appends to a bounded queue and calls ``on_publish`` (which should just
+schedule a dispatch, e.g. with ``Clock.schedule_once``). ``dispatch`` runs
+on the consumer's thread and hands every subscriber, once, all new records
+of the devices and channels it subscribed to::
+
+    bus.subscribe(history.consume)  # Everything
+    bus.subscribe(show_pressures, channels=("pressure_inlet", "pressure_outlet"))
+    bus.subscribe(check_oxygenator, devices=("oxy2",))
+
+Every record carries the host ``time.monotonic()`` it was sampled at.
+``dispatch`` merges the devices' records into one timeline ordered by
+that time, so a subscriber sees e.g. a pressure spike and the flow drop
+it caused in the order they happened, not in the order their ports were
+read. Subscribers that keep the times (``timestamps=True``) are called
+as ``callback(records, times=times)``.
+"""
+import collections
+import heapq
+import operator
+import time
+
+
+class Subscription:
+    """A callback and the devices and channels it wants (None: all)."""
+
+    def __init__(self, callback, channels=None, devices=None, timestamps=False):
+        self.callback = callback
+        self.channels = None if channels is None else frozenset(channels)
+        self.devices = None if devices is None else frozenset(devices)
+        self.timestamps = timestamps
+
+    def select(self, timeline):
+        """Return the records of ``timeline`` this subscription wants and their times, oldest first."""
+        records = []
+        times = []
+        for sampled, device, record in timeline:
+            if self.devices is not None and device not in self.devices:
+                continue
+            if self.channels is not None:
+                record = {name: value for name, value in record.items() if name in self.channels}
+                if not record:
+                    continue
+            records.append(record)
+            times.append(sampled)
+        return records, times
+
+    def deliver(self, timeline):
+        records, times = self.select(timeline)
+        if not records:
+            return
+        if self.timestamps:
+            self.callback(records, times=times)
+        else:
+            self.callback(records)
+
+
+class EventBus:
+    """Fan records in from any number of devices and out to subscribers.
+
+    ``published`` counts batches published; when dispatching falls behind
+    by more than ``maxlen`` batches the oldest are dropped and counted in
+    ``dropped``.
+    """
+
+    def __init__(self, on_publish=None, maxlen=4096):
+        self.on_publish = on_publish
+        self.subscriptions = []
+        self.published = 0
+        self.dropped = 0
+        # deque.append/popleft are atomic, so publishers and the dispatcher need no lock
+        self._batches = collections.deque(maxlen=maxlen)
+
+    @property
+    def pending(self):
+        """Batches published but not dispatched yet."""
+        return len(self._batches)
+
+    def subscribe(self, callback, channels=None, devices=None, timestamps=False):
+        """Call ``callback(records)`` with new records of ``channels`` from ``devices``."""
+        subscription = Subscription(callback, channels, devices, timestamps)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.remove(subscription)
+
+    def publish(self, device, records, times=None):
+        """Queue a batch of records from ``device``; safe to call from any thread.
+
+        ``times`` holds each record's sample time, in order (default: now).
+        """
+        if times is None:
+            times = [time.monotonic()] * len(records)
+        if len(self._batches) == self._batches.maxlen:
+            self.dropped += 1
+        self._batches.append((device, records, times))
+        self.published += 1
+        if self.on_publish is not None:
+            self.on_publish()
+
+    def dispatch(self):
+        """Deliver everything queued; return the number of batches delivered."""
+        batches = []
+        while True:
+            try:
+                batches.append(self._batches.popleft())
+            except IndexError:
+                break
+        if not batches:
+            return 0
+        timeline = self.timeline(batches)
+        for subscription in list(self.subscriptions):
+            subscription.deliver(timeline)
+        return len(batches)
+
+    @staticmethod
+    def timeline(batches):
+        """Merge the batches into one list of (time, device, record) ordered by time.
+
+        Each device's records are already in time order, so this is a k-way
+        merge of one stream per device.
+        """
+        streams = {}
+        for device, records, times in batches:
+            stream = streams.get(device)
+            if stream is None:
+                stream = streams[device] = []
+            stream.extend(zip(times, [device] * len(records), records))
+        if len(streams) == 1:
+            return next(iter(streams.values()))
+        return list(heapq.merge(*streams.values(), key=operator.itemgetter(0)))
@@ -0,0 +1,116 @@
+"""Map a board's firmware clock onto the host's ``time.monotonic()``.
+
+Firmware that supports it stamps every telemetry line with its
+``millis()`` (``@<ms>;<line>``, see ``telemetry.TextCodec``) and answers a
+``SYNC:<n>`` ping with ``SYNC:<n>,<ms>``. Like NTP, a ping sent at host
+time t0 and answered at t1 puts the board's ``ms`` at about (t0 + t1) / 2,
+with an error of at most half the round trip. ``ClockSync`` pings every
+``interval`` seconds, keeps the last ``window`` replies and anchors the
+offset on the one with the shortest round trip (the least delayed by USB
+and the firmware's loop). The boards' ceramic resonators run up to 0.5%
+fast or slow, so the drift is fitted over the quickest half of the
+replies.
+
+A stamped sample then gets the host time it was taken at, rather than the
+time its bytes happened to be read, so samples of different boards can be
+put in order and the latency from sensor to screen measured.
+"""
+import collections
+import time
+
+from telemetry import SYNC_PREFIX
+
+MILLIS_WRAP = 2 ** 32  # millis() is an unsigned long, it wraps after 49.7 days
+MIN_DRIFT_SPAN = 10.0  # Seconds of device time the replies must span to fit the drift
+
+
+def format_sync_request(seq):
+    return f"{SYNC_PREFIX}{seq}\n".encode('utf-8')
+
+
+class ClockSync:
+    """Offset (and drift) of one board's ``millis()`` clock from the host clock.
+
+    The first ``burst`` pings go out ``burst_interval`` apart so the
+    offset is known within a second of connecting. ``rtt`` is the round
+    trip of the reply the offset is anchored on.
+    """
+
+    def __init__(self, interval=2.0, window=16, burst=4, burst_interval=0.1):
+        self.interval = interval
+        self.window = window
+        self.burst = burst
+        self.burst_interval = burst_interval
+        self.pings = 0
+        self.replies = 0
+        self.reset()
+
+    def reset(self):
+        """Forget everything, e.g. after the board reset and its ``millis()`` restarted."""
+        self._samples = collections.deque(maxlen=self.window)  # (rtt, device s, offset s)
+        self._seq = 0
+        self._sent = None  # (seq, host time) of the ping awaiting its reply
+        self._next_ping = 0.0
+        self._wraps = 0
+        self._last_ms = None
+        self.offset = None  # Host time minus device time at ``_anchor`` device seconds
+        self.drift = 0.0  # Seconds the offset changes per device second
+        self.rtt = None
+        self._anchor = 0.0
+
+    @property
+    def synced(self):
+        return self.offset is not None
+
+    def next_ping(self):
+        """Host time the next ping is due."""
+        return self._next_ping
+
+    def request(self, now=None):
+        """Start a ping; return the bytes to send to the board."""
+        now = time.monotonic() if now is None else now
+        self._seq += 1
+        self._sent = (self._seq, now)
+        self.pings += 1
+        self._next_ping = now + (self.burst_interval if len(self._samples) < self.burst else self.interval)
+        return format_sync_request(self._seq)
+
+    def reply(self, seq, device_ms, now=None):
+        """Take the board's ``SYNC:<seq>,<ms>`` reply."""
+        now = time.monotonic() if now is None else now
+        if self._sent is None or self._sent[0] != seq:
+            return  # Late reply to an older ping, its round trip is unknown
+        sent = self._sent[1]
+        self._sent = None
+        self.replies += 1
+        device = self.device_seconds(device_ms)
+        self._samples.append((now - sent, device, (sent + now) / 2 - device))
+        self._estimate()
+
+    def _estimate(self):
+        best = sorted(self._samples)
+        self.rtt, self._anchor, self.offset = best[0]
+        quick = best[:max(2, len(best) // 2)]
+        devices = [device for _, device, _ in quick]
+        if len(quick) < 2 or max(devices) - min(devices) < MIN_DRIFT_SPAN:
+            return  # Keep the previous drift until the replies span long enough
+        # Least-squares slope of the offset over device time
+        mean_device = sum(devices) / len(quick)
+        mean_offset = sum(offset for _, _, offset in quick) / len(quick)
+        variance = sum((device - mean_device) ** 2 for device in devices)
+        covariance = sum((device - mean_device) * (offset - mean_offset) for _, device, offset in quick)
+        self.drift = covariance / variance
+
+    def device_seconds(self, device_ms):
+        """Board ``millis()`` as seconds since the board started, across wraps."""
+        if self._last_ms is not None and device_ms < self._last_ms - MILLIS_WRAP // 2:
+            self._wraps += 1
+        self._last_ms = device_ms
+        return (self._wraps * MILLIS_WRAP + device_ms) / 1000.0
+
+    def to_host(self, device_ms):
+        """Host ``time.monotonic()`` of a board ``millis()`` stamp (None until synced)."""
+        device = self.device_seconds(device_ms)
+        if self.offset is None:
+            return None
+        return device + self.offset + self.drift * (device - self._anchor)
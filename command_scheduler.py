@@ -0,0 +1,114 @@
+"""Asynchronous, rate-limited command pipeline for the blood pump Arduino.
+
+Setpoint changes are submitted per command channel (``M`` pump speed,
+``F`` air flow). Until a channel's command has been sent, a newer value
+simply replaces the queued one, so fast tapping on ``+``/``-`` sends only
+the newest setpoint. A worker thread writes at most one command per
+``min_interval`` and waits for the firmware's ``ACK:<prefix>`` before
+sending the next one.
+
+The UI and any automatic controller share the same scheduler::
+
+    scheduler.submit(PUMP_SPEED_COMMAND, rpm, source="pid")
+
+so a future closed-loop controller (e.g. a PID loop holding
+``blood_flow_rate`` at target) never races the touchscreen on the port.
+"""
+import collections
+import threading
+import time
+
+import serial
+
+
+class CommandScheduler(threading.Thread):
+    """Coalesce, rate limit and send setpoint commands on a background thread.
+
+    ``encode(prefix, value)`` turns a command into bytes for the current
+    protocol. With ``ack_timeout=None`` no acknowledgement is awaited (for
+    firmware that does not send ``ACK:`` lines). ``connection`` may be None
+    until the port is open; commands queue up until ``set_connection``.
+    """
+
+    def __init__(self, connection, encode, min_interval=0.05, ack_timeout=0.5, name="CommandScheduler"):
+        super(CommandScheduler, self).__init__(name=name, daemon=True)
+        self.connection = connection
+        self.encode = encode
+        self.min_interval = min_interval
+        self.ack_timeout = ack_timeout
+        self.last_sent = {}  # prefix -> (value, source) of the newest command written
+        self.sent = 0
+        self.coalesced = 0
+        self.ack_timeouts = 0
+        self._pending = collections.OrderedDict()  # prefix -> (value, source), oldest first
+        self._cond = threading.Condition()
+        self._acked = threading.Event()
+        self._in_flight = None  # Prefix of the command waiting for its ACK
+        self._stop_event = threading.Event()
+
+    def submit(self, prefix, value, source="ui"):
+        """Queue a setpoint; replaces any value for ``prefix`` not sent yet. Never blocks."""
+        with self._cond:
+            if prefix in self._pending:
+                self.coalesced += 1  # The channel keeps its place in line
+            self._pending[prefix] = (value, source)
+            self._cond.notify()
+
+    def set_connection(self, connection):
+        """Start (or stop, with None) writing to ``connection``."""
+        with self._cond:
+            self.connection = connection
+            self._cond.notify()
+
+    def resend_all(self):
+        """Queue the newest value of every channel again, e.g. after the firmware reset."""
+        with self._cond:
+            for prefix, (value, source) in self.last_sent.items():
+                self._pending.setdefault(prefix, (value, source))
+            self._cond.notify()
+
+    def acknowledge(self, prefix):
+        """Called by the pump reader when the firmware acknowledges a command."""
+        if prefix == self._in_flight:
+            self._acked.set()
+
+    def run(self):
+        last_write = 0.0
+        while True:
+            with self._cond:
+                while (not self._pending or self.connection is None) and not self._stop_event.is_set():
+                    self._cond.wait()
+                if self._stop_event.is_set():
+                    return
+            # Rate limit to what the firmware can process
+            delay = last_write + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._cond:
+                if not self._pending or self.connection is None:
+                    continue
+                connection = self.connection
+                prefix, (value, source) = self._pending.popitem(last=False)
+            self._acked.clear()
+            self._in_flight = prefix
+            try:
+                connection.write(self.encode(prefix, value))
+                connection.flush()
+            except (serial.SerialException, OSError) as e:
+                print(f"Error sending {prefix}:{value} to blood pump: {e}")
+                with self._cond:
+                    # Try again, on the new connection if the reader is reconnecting
+                    self._pending.setdefault(prefix, (value, source))
+                continue
+            finally:
+                last_write = time.monotonic()
+            self.last_sent[prefix] = (value, source)
+            self.sent += 1
+            print(f"Sent {prefix}:{value} ({source}) to blood pump")  # Log for debugging
+            if self.ack_timeout is not None and not self._acked.wait(self.ack_timeout):
+                self.ack_timeouts += 1
+
+    def stop(self):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify()
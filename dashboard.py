@@ -0,0 +1,247 @@
+"""Dashboard layout shared by test1101.py and ECMO-Touchscreen.py.
+
+Every value on the dashboard is described once in ``CHANNELS``: the
+telemetry field (and ``MainPage`` attribute) it comes from, the panel that
+shows it, its unit and format, and on paired panels whether it is the inlet
+or the outlet value. ``Dashboard`` generates the panels from the registry,
+in registry order, three per row, and binds them to the display.
+"""
+import copy
+import threading
+
+from kivy.clock import Clock
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.label import Label
+
+from display import DisplayBinding
+from panels import DataPanel
+from telemetry import PUMP_SPEED_COMMAND, AIR_FLOW_COMMAND
+
+INLET_TREND_COLOR = (0.3, 0.8, 1, 0.6)
+OUTLET_TREND_COLOR = (1, 0.6, 0.2, 0.6)
+
+
+class Channel:
+    """One value shown on the dashboard.
+
+    Channels with the same ``panel`` title share a panel and are drawn side
+    by side, labelled with their ``side``. ``board`` is the Arduino the
+    value comes from (``"sensor"`` or ``"pump"``), if any, and ``trend`` the
+    color of the trend line drawn behind the panel. Setpoints have a ``module``
+    name (touching the panel selects it for the +/- buttons), a ``step``
+    (``down_step`` if '-' moves by a different amount), an optional
+    ``floor`` the '-' button only steps down from while the value is above
+    it and, if the blood pump Arduino takes them, the ``command`` prefix
+    they are sent with.
+    """
+
+    def __init__(self, field, panel, unit, fmt="{:.1f}", side=None, board=None, trend=None,
+                 module=None, step=None, down_step=None, floor=None, command=None):
+        self.field = field
+        self.panel = panel
+        self.unit = unit
+        self.fmt = fmt if side is None else f"{side}\n{fmt}"
+        self.side = side
+        self.board = board
+        self.trend = trend
+        self.module = module
+        self.step = step
+        self.down_step = step if down_step is None else down_step
+        self.floor = floor
+        self.command = command
+
+    def with_steps(self, step, down_step=None, floor=None):
+        """Return a copy of this setpoint that steps by ``step`` (and ``down_step``) above ``floor``."""
+        channel = copy.copy(self)
+        channel.step = step
+        channel.down_step = step if down_step is None else down_step
+        channel.floor = floor
+        return channel
+
+
+# Setpoint steps are the ones of test1101.py; ECMO-Touchscreen.py swaps in its own
+CHANNELS = (
+    # Prefix 'M:' for motor speed, the Arduino routes this to 0x63
+    Channel("blood_pump_value", "Rotation Speed", "RPM", "{}", module="Blood Pump", step=50,
+            command=PUMP_SPEED_COMMAND),
+    Channel("blood_flow_rate", "Blood Flow", "LPM", "{:.2f}", board="pump", trend=INLET_TREND_COLOR),
+    Channel("pressure_inlet", "Pressure", "mmHg", side="Inlet", board="pressure"),
+    Channel("pressure_outlet", "Pressure", "mmHg", side="Outlet", board="pressure"),
+
+    Channel("o2_flow_value", "O2 Flow Rate", "LPM", module="O2 Flow Rate", step=0.5),
+    Channel("oxygen_concentration", "O2 Concentration", "Percent (%)", board="sensor"),
+    Channel("oxygen_saturation_inlet", "O2 Saturation", "Percent (%)", side="Inlet", board="sensor",
+            trend=INLET_TREND_COLOR),
+    Channel("oxygen_saturation_outlet", "O2 Saturation", "Percent (%)", side="Outlet", board="sensor",
+            trend=OUTLET_TREND_COLOR),
+
+    # Prefix 'F:' for the air flow rate
+    Channel("air_flow_value", "Air Flow", "LPM", module="Air Flow", step=0.5, down_step=0.1,
+            floor=0.0, command=AIR_FLOW_COMMAND),
+    Channel("co2_outlet", "CO2 Outlet", "Percent (%)", "{:.2f}", board="sensor", trend=INLET_TREND_COLOR),
+    Channel("temperature1", "Temperature", "\u00b0C", side="Inlet", board="sensor", trend=INLET_TREND_COLOR),
+    Channel("temperature2", "Temperature", "\u00b0C", side="Outlet", board="sensor", trend=OUTLET_TREND_COLOR),
+)
+
+# Metrics computed from the channels above (see derived.py), shown after them
+DERIVED_CHANNELS = (
+    Channel("o2_transfer", "O2 Transfer", "mL/min", "{:.0f}", side="Now", trend=INLET_TREND_COLOR),
+    Channel("o2_transfer_5min", "O2 Transfer", "mL/min", "{:.0f}", side="5 min"),
+    Channel("heat_exchanger_delta", "Heat Exchanger \u0394T", "\u00b0C", "{:+.1f}", trend=INLET_TREND_COLOR),
+    Channel("pump_efficiency", "Pump Efficiency", "LPM / 1000 RPM", "{:.2f}"),
+)
+
+
+class Dashboard(GridLayout):
+    """The main page without its data sources.
+
+    Subclasses feed values by setting the channel attributes and calling
+    ``schedule_update`` (from any thread) or ``update_labels``, implement
+    ``update_from_serial``, and override ``setpoint_changed`` to send
+    setpoints.
+    """
+
+    def __init__(self, channels=CHANNELS, **kwargs):
+        super(Dashboard, self).__init__(**kwargs)
+        self.cols = 2
+        self.spacing = 5
+        self.padding = [10, 10, 10, 10]
+
+        # Initialize active module tracker and values
+        self.channels = channels
+        self.active_module = None
+        for channel in channels:
+            setattr(self, channel.field, 0.0)
+        self.setpoints = {channel.module: channel for channel in channels if channel.module}
+        # Field -> boards its value comes from; subclasses add the ones of computed values
+        self.sources = {channel.field: {channel.board} for channel in channels if channel.board}
+
+        # Left Column: Main Dashboard
+        dashboard_layout = GridLayout(cols=1)
+
+        # Top Row: Battery and Time
+        top_row = BoxLayout(size_hint_y=None, height=50, spacing=10)
+        battery_label = Label(text="[b]Battery[/b]", markup=True, size_hint_x=0.7, halign="left", valign="middle")
+        time_label = Label(text="Date: 10/25/2024  Time: 4:45PM", size_hint_x=0.3, halign="right", valign="middle")
+        top_row.add_widget(battery_label)
+        top_row.add_widget(time_label)
+        dashboard_layout.add_widget(top_row)
+
+        # Data Panels, one per panel title in the registry; channels are bound
+        # to their text once and only redrawn when it changes
+        self.data_grid = GridLayout(cols=3, spacing=10, padding=[0, 10, 0, 10])
+        self.display = DisplayBinding()
+        self.panels = {}  # Panel title -> DataPanel
+        self.value_labels = {}  # Field -> text showing it
+        grouped = {}
+        for channel in channels:
+            grouped.setdefault(channel.panel, []).append(channel)
+        for title, members in grouped.items():
+            panel = DataPanel(title, members[0].unit, [channel.fmt.format(0.0) for channel in members])
+            for channel, text in zip(members, panel.value_texts):
+                self.value_labels[channel.field] = text
+                self.display.bind(channel.field, text, channel.fmt)
+                if channel.module:
+                    # Touching the panel selects the module for the +/- buttons
+                    panel.module_name = channel.module
+                    panel.bind(on_touch_down=self.on_module_touch)
+            self.panels[title] = panel
+            self.data_grid.add_widget(panel)
+        dashboard_layout.add_widget(self.data_grid)
+
+        # Bottom Row: Control Buttons (Alarm, Lock, Setup, Main Page)
+        control_buttons = BoxLayout(size_hint_y=None, height=50, spacing=10)
+        self.alarm_button = Button(text="Alarm", background_color=[1, 0, 0, 1])
+        self.lock_button = Button(text="Lock", background_color=[0, 0, 0, 1])
+        self.setup_button = Button(text="Setup", background_color=[0.5, 0.5, 0.5, 1])
+        self.main_page_button = Button(text="Main Page", background_color=[0.5, 0.5, 1, 1])
+        control_buttons.add_widget(self.alarm_button)
+        control_buttons.add_widget(self.lock_button)
+        control_buttons.add_widget(self.setup_button)
+        control_buttons.add_widget(self.main_page_button)
+        dashboard_layout.add_widget(control_buttons)
+
+        # Add the dashboard layout to the main grid
+        self.add_widget(dashboard_layout)
+
+        # Right Column: Plus and Minus Buttons
+        self.plus_button = Button(text="+", size_hint_y=0.5, font_size=32)
+        self.plus_button.bind(on_press=self.increase_values)
+        self.minus_button = Button(text="-", size_hint_y=0.5, font_size=32)
+        self.minus_button.bind(on_press=self.decrease_values)
+
+        # Layout for the control buttons
+        button_layout = BoxLayout(orientation="vertical", size_hint_x=0.083)
+        button_layout.add_widget(self.plus_button)
+        button_layout.add_widget(self.minus_button)
+        self.add_widget(button_layout)
+
+        # Disable buttons by default
+        self.plus_button.disabled = True
+        self.minus_button.disabled = True
+
+        self._update_scheduled = threading.Event()
+
+    def schedule_update(self):
+        """Called from the reader threads; queue at most one UI update per frame."""
+        if not self._update_scheduled.is_set():
+            self._update_scheduled.set()
+            Clock.schedule_once(self.update_from_serial)
+
+    def update_from_serial(self, dt):
+        """Apply all queued records; implemented by the entry points."""
+        # Clear first so records arriving while we drain schedule another update
+        self._update_scheduled.clear()
+
+    def show_placeholder(self, board, text):
+        """Show ``text`` instead of the values from ``board`` until its next values arrive."""
+        for channel in self.channels:
+            if board in self.sources.get(channel.field, ()):
+                self.display.show(channel.field, text if channel.side is None else f"{channel.side}\n{text}")
+
+    def update_labels(self):
+        """Push the latest values through the display bindings; only changed labels are redrawn."""
+        self.display.update({name: getattr(self, name) for name in self.display.channels})
+
+    def on_module_touch(self, instance, touch):
+        """Handle touch events to select a module and enable the buttons."""
+        if instance.collide_point(touch.x, touch.y):
+            self.active_module = instance.module_name  # Set the active module
+            self.active_label = instance.value_label  # Reference the label to update
+            self.show_buttons()
+
+    def show_buttons(self):
+        """Enable or disable the '+' and '-' buttons based on active module."""
+        if self.active_module:
+            self.plus_button.disabled = False
+            self.minus_button.disabled = False
+        else:
+            self.plus_button.disabled = True
+            self.minus_button.disabled = True
+
+    def increase_values(self, instance):
+        self.step_setpoint(1)
+
+    def decrease_values(self, instance):
+        self.step_setpoint(-1)
+
+    def step_setpoint(self, direction):
+        """Move the active module's setpoint one step up (1) or down (-1)."""
+        channel = self.setpoints.get(self.active_module)
+        if channel is None:
+            return
+        value = getattr(self, channel.field)
+        if direction > 0:
+            value += channel.step
+        elif channel.floor is None or value > channel.floor:  # Prevent negative values
+            value -= channel.down_step
+        else:
+            return
+        setattr(self, channel.field, value)
+        self.setpoint_changed(channel)
+
+    def setpoint_changed(self, channel):
+        """Show a setpoint changed from the touchscreen."""
+        self.display.update({channel.field: getattr(self, channel.field)})
@@ -0,0 +1,81 @@
+"""Hidden debug overlay showing the ``profiling.PROFILER`` statistics.
+
+Opened by holding the Setup button (see test1101.py). While it is open the
+profiler runs and the table refreshes every second; it can pause or
+reset the profiler and export the statistics to a JSON file.
+"""
+from kivy.clock import Clock
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+from kivy.uix.modalview import ModalView
+
+from profiling import PROFILER
+
+
+class ProfilerOverlay(ModalView):
+    """Full-screen table of stage timings, gauges and counters.
+
+    ``on_enable(enabled)`` is called when profiling starts or pauses, so the
+    page can add or remove its per-frame sampling; ``export_path()`` returns
+    where to save the statistics.
+    """
+
+    def __init__(self, on_enable, export_path, refresh_interval=1.0, **kwargs):
+        kwargs.setdefault("size_hint", (0.9, 0.9))
+        kwargs.setdefault("auto_dismiss", False)
+        super(ProfilerOverlay, self).__init__(**kwargs)
+        self.on_enable = on_enable
+        self.export_path = export_path
+        self.refresh_interval = refresh_interval
+        self._refresh_event = None
+        self._was_enabled = PROFILER.enabled
+
+        layout = BoxLayout(orientation="vertical", spacing=5, padding=10)
+        self.table = Label(font_name="RobotoMono-Regular", font_size=14, halign="left", valign="top")
+        self.table.bind(size=self.table.setter("text_size"))
+        layout.add_widget(self.table)
+        buttons = BoxLayout(size_hint_y=0.12, spacing=5)
+        self.pause_button = Button(text="Pause")
+        self.pause_button.bind(on_press=self.toggle_paused)
+        reset_button = Button(text="Reset")
+        reset_button.bind(on_press=self.reset)
+        export_button = Button(text="Export")
+        export_button.bind(on_press=self.export)
+        close_button = Button(text="Close")
+        close_button.bind(on_press=self.dismiss)
+        for button in (self.pause_button, reset_button, export_button, close_button):
+            buttons.add_widget(button)
+        layout.add_widget(buttons)
+        self.add_widget(layout)
+
+    def on_open(self):
+        self._was_enabled = PROFILER.enabled
+        self.set_enabled(True)
+        self.refresh()
+        self._refresh_event = Clock.schedule_interval(self.refresh, self.refresh_interval)
+
+    def on_dismiss(self):
+        self._refresh_event.cancel()
+        self.set_enabled(self._was_enabled)  # Keeps running if started with ECMO_PROFILE
+
+    def set_enabled(self, enabled):
+        self.on_enable(enabled)
+        self.pause_button.text = "Pause" if enabled else "Resume"
+
+    def toggle_paused(self, instance):
+        self.set_enabled(not PROFILER.enabled)
+        self.refresh()
+
+    def reset(self, instance):
+        PROFILER.reset()
+        self.refresh()
+
+    def export(self, instance):
+        path = PROFILER.export(self.export_path())
+        print(f"Profile saved to {path}")
+        self.refresh()
+        self.table.text += f"\nsaved to {path}"
+
+    def refresh(self, dt=None):
+        self.table.text = PROFILER.report()
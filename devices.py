@@ -0,0 +1,77 @@
+"""Registry of the boards on the bench.
+
+Each ``DeviceSpec`` names a board, says which protocol it speaks (its
+``kind``) and where to find it. Any number of boards can be listed, e.g.
+extra pressure transducers or a second oxygenator's sensor board, in a
+JSON file::
+
+    [
+        {"name": "sensor", "kind": "sensor", "port": "/dev/ttyACM1"},
+        {"name": "pump", "kind": "pump", "port": "/dev/ttyACM0", "baudrate": 115200, "commands": true},
+        {"name": "pressure", "kind": "pressure", "port": "/dev/ttyUSB0", "usb_ids": "1a86:7523"},
+        {"name": "oxy2", "kind": "sensor", "port": "/dev/ttyACM2", "serial_number": "95730333", "prefix": "oxy2.",
+         "clock_sync": true}
+    ]
+"""
+import json
+
+from ports import parse_usb_ids
+from telemetry import SENSOR_FIELDS, PRESSURE_KEYS, parse_sensor_line, parse_pump_line, parse_pressure_line
+
+# Line parser and channels of each kind of board
+DEVICE_KINDS = {
+    "sensor": (parse_sensor_line, SENSOR_FIELDS),
+    "pump": (parse_pump_line, ("blood_flow_rate",)),
+    "pressure": (parse_pressure_line, tuple(PRESSURE_KEYS.values())),
+}
+
+# Kinds whose firmware can switch to binary framing (see binary_protocol)
+BINARY_KINDS = ("sensor", "pump")
+
+
+class DeviceSpec:
+    """One board: ``name`` identifies it on the bus, ``kind`` selects its protocol.
+
+    ``prefix`` is prepended to the board's channel names, so a second
+    oxygenator's sensor board (prefix ``"oxy2."``) does not overwrite the
+    first one's values. ``commands`` marks the board that takes the pump
+    speed and air flow setpoints. ``clock_sync`` marks firmware that
+    timestamps its lines and answers ``SYNC:`` pings (see clock_sync.py);
+    older sketches would take the pings for commands. ``usb_ids`` and
+    ``serial_number`` let the board be found on another device path; set
+    them only if no other board shares them (see ports.py).
+    """
+
+    def __init__(self, name, kind, port, baudrate=9600, usb_ids=None, prefix="", commands=False,
+                 clock_sync=False, serial_number=None):
+        if kind not in DEVICE_KINDS:
+            raise ValueError(f"Unknown device kind {kind!r}, expected one of {tuple(DEVICE_KINDS)}")
+        self.name = name
+        self.kind = kind
+        self.port = port
+        self.baudrate = baudrate
+        self.usb_ids = usb_ids
+        self.serial_number = serial_number
+        self.prefix = prefix
+        self.commands = commands
+        self.clock_sync = clock_sync
+
+    @property
+    def parser(self):
+        return DEVICE_KINDS[self.kind][0]
+
+    @property
+    def channels(self):
+        return tuple(self.prefix + name for name in DEVICE_KINDS[self.kind][1])
+
+
+def load_devices(path):
+    """Read the device specs from a JSON file (see the module docstring)."""
+    with open(path) as devices_file:
+        entries = json.load(devices_file)
+    devices = []
+    for entry in entries:
+        if isinstance(entry.get("usb_ids"), str):
+            entry["usb_ids"] = parse_usb_ids(entry["usb_ids"])
+        devices.append(DeviceSpec(**entry))
+    return tuple(devices)
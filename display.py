@@ -0,0 +1,63 @@
+"""Display bindings between telemetry channels and dashboard labels.
+
+Changing ``Label.text`` re-rasterizes the label texture, which is the most
+expensive part of an update on a low-power board. ``DisplayBinding`` keeps
+the last text written to each label and only assigns ``text`` when the
+formatted value actually changed; all changes are applied together in one
+frame.
+"""
+import time
+
+from kivy.clock import Clock
+
+from profiling import PROFILER
+
+
+class DisplayBinding:
+    """Map each channel to the labels that show it, once, and update lazily."""
+
+    def __init__(self):
+        self._bindings = {}  # channel -> [(label, format string)]
+        self._shown = {}  # label -> text currently on screen
+        self._pending = {}  # label -> text to write on the next frame
+        self._flush_trigger = Clock.create_trigger(self.flush)
+
+    @property
+    def channels(self):
+        return self._bindings.keys()
+
+    def bind(self, channel, label, fmt="{:.1f}"):
+        """Show ``channel`` on ``label`` using ``fmt`` (a ``str.format`` pattern)."""
+        self._bindings.setdefault(channel, []).append((label, fmt))
+        self._shown[label] = label.text
+
+    def update(self, values):
+        """Queue the labels whose formatted text differs from what is shown."""
+        for channel, value in values.items():
+            for label, fmt in self._bindings.get(channel, ()):
+                text = fmt.format(value)
+                if self._pending.get(label, self._shown[label]) != text:
+                    self._pending[label] = text
+        if self._pending:
+            self._flush_trigger()
+
+    def show(self, channel, text):
+        """Queue a fixed text, e.g. a placeholder, on the labels of ``channel``."""
+        for label, fmt in self._bindings.get(channel, ()):
+            if self._pending.get(label, self._shown[label]) != text:
+                self._pending[label] = text
+        if self._pending:
+            self._flush_trigger()
+
+    def flush(self, *args):
+        """Write all queued texts to their labels."""
+        pending, self._pending = self._pending, {}
+        profiling = PROFILER.enabled
+        if profiling:
+            start = time.perf_counter()
+        for label, text in pending.items():
+            if self._shown[label] != text:
+                label.text = text
+                self._shown[label] = text
+        if profiling:
+            PROFILER.add_time("label flush", time.perf_counter() - start)
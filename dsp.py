@@ -0,0 +1,215 @@
+"""Streaming filters applied to telemetry between parsing and display.
+
+Each filter is a callable that takes the next sample of one channel and
+returns the filtered value, with constant work per sample (the sliding
+median is O(log n) in its window). ``SignalProcessor`` keeps one chain of
+filters per channel, built from factories so every channel gets its own
+state::
+
+    processor = SignalProcessor({
+        "blood_flow_rate": (partial(SpikeRejector, max_jump=1.5), partial(ExponentialSmoother, 0.5)),
+    })
+    filtered = processor.process(records)
+
+Channels without a chain pass through unchanged.
+"""
+import collections
+import heapq
+import math
+from functools import partial
+
+
+class MovingAverage:
+    """Mean of the last ``size`` samples, kept as a running sum."""
+
+    def __init__(self, size):
+        self.size = size
+        self._window = collections.deque()
+        self._sum = 0.0
+
+    def __call__(self, value):
+        self._window.append(value)
+        self._sum += value
+        if len(self._window) > self.size:
+            self._sum -= self._window.popleft()
+        return self._sum / len(self._window)
+
+
+class ExponentialSmoother:
+    """Exponential moving average; ``alpha`` is the weight of the newest sample."""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self._value = None
+
+    def __call__(self, value):
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self.alpha * (value - self._value)
+        return self._value
+
+
+class SlidingMedian:
+    """Median of the last ``size`` samples.
+
+    The window is split between a max-heap of the lower half and a min-heap
+    of the upper half. Samples leaving the window are not searched for:
+    they are counted in ``_expired`` and dropped once they reach the top of
+    their heap, so every update is O(log size). Expired samples buried in a
+    heap are cleared by rebuilding both heaps from the window once they
+    outnumber the live ones, which keeps the amortized cost the same.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._window = collections.deque()
+        self._low = []  # Lower half, negated so heapq gives the largest
+        self._high = []  # Upper half
+        self._low_count = 0  # Live samples in each heap
+        self._high_count = 0
+        self._expired = collections.Counter()
+
+    def __call__(self, value):
+        if not self._low or value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_count += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_count += 1
+        self._window.append(value)
+        if len(self._window) > self.size:
+            self._remove(self._window.popleft())
+            if len(self._low) + len(self._high) > 2 * self.size + 8:
+                self._rebuild()
+        self._balance()
+        if self._low_count > self._high_count:
+            return -self._low[0]
+        return (self._high[0] - self._low[0]) / 2.0
+
+    def _remove(self, value):
+        self._expired[value] += 1
+        if value <= -self._low[0]:
+            self._low_count -= 1
+            if value == -self._low[0]:
+                self._prune(self._low, -1)
+        else:
+            self._high_count -= 1
+            if value == self._high[0]:
+                self._prune(self._high, 1)
+
+    def _rebuild(self):
+        ordered = sorted(self._window)
+        middle = (len(ordered) + 1) // 2
+        self._low = [-value for value in ordered[middle - 1::-1]]  # Descending negated is a valid heap
+        self._high = ordered[middle:]
+        self._low_count = len(self._low)
+        self._high_count = len(self._high)
+        self._expired.clear()
+
+    def _balance(self):
+        # The lower half holds as many samples as the upper half, or one more
+        if self._low_count > self._high_count + 1:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_count -= 1
+            self._high_count += 1
+            self._prune(self._low, -1)
+        elif self._low_count < self._high_count:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._low_count += 1
+            self._high_count -= 1
+            self._prune(self._high, 1)
+
+    def _prune(self, heap, sign):
+        """Pop expired samples off the top of ``heap``."""
+        while heap:
+            value = sign * heap[0]
+            if not self._expired[value]:
+                return
+            self._expired[value] -= 1
+            if not self._expired[value]:
+                del self._expired[value]
+            heapq.heappop(heap)
+
+
+class SpikeRejector:
+    """Hold the last accepted value when a sample jumps more than ``max_jump`` from it.
+
+    A real step change looks like a spike at first; after ``max_held``
+    consecutive rejected samples the new level is accepted.
+    """
+
+    def __init__(self, max_jump, max_held=3):
+        self.max_jump = max_jump
+        self.max_held = max_held
+        self.rejected = 0  # Samples rejected since the start
+        self._value = None
+        self._held = 0
+
+    def __call__(self, value):
+        if self._value is None or abs(value - self._value) <= self.max_jump or self._held >= self.max_held:
+            self._value = value
+            self._held = 0
+        else:
+            self._held += 1
+            self.rejected += 1
+        return self._value
+
+
+class FilterChain:
+    """Filters applied one after the other to a channel's samples."""
+
+    def __init__(self, filters):
+        self.filters = list(filters)
+        self.last = None  # Newest filtered value
+
+    def __call__(self, value):
+        # NaN / inf from a corrupted reading never reach the filter state
+        if not math.isfinite(value):
+            return self.last
+        for stage in self.filters:
+            value = stage(value)
+        self.last = value
+        return value
+
+
+class SignalProcessor:
+    """A ``FilterChain`` per channel, built from ``config``: channel -> filter factories."""
+
+    def __init__(self, config):
+        self.config = dict(config)
+        self.chains = {channel: FilterChain(factory() for factory in factories)
+                       for channel, factories in self.config.items()}
+
+    def process(self, records):
+        """Return the filtered copy of a batch of records.
+
+        A channel whose filter has no output yet (a non-finite first sample)
+        is left out of the filtered record.
+        """
+        chains = self.chains
+        filtered = []
+        for record in records:
+            output = {}
+            for name, value in record.items():
+                chain = chains.get(name)
+                if chain is None:
+                    output[name] = value
+                else:
+                    value = chain(value)
+                    if value is not None:
+                        output[name] = value
+            filtered.append(output)
+        return filtered
+
+
+# Per-channel filters for the sensor and pump boards at about 1 sample per second
+DEFAULT_FILTERS = {
+    "oxygen_saturation_inlet": (partial(SpikeRejector, max_jump=10.0), partial(SlidingMedian, 5)),
+    "oxygen_saturation_outlet": (partial(SpikeRejector, max_jump=10.0), partial(SlidingMedian, 5)),
+    "temperature1": (partial(SpikeRejector, max_jump=2.0), partial(MovingAverage, 4)),
+    "temperature2": (partial(SpikeRejector, max_jump=2.0), partial(MovingAverage, 4)),
+    "oxygen_concentration": (partial(ExponentialSmoother, 0.3),),
+    "co2_outlet": (partial(SlidingMedian, 3),),
+    "blood_flow_rate": (partial(SpikeRejector, max_jump=1.5), partial(ExponentialSmoother, 0.5)),
+}
@@ -0,0 +1,103 @@
+"""Fixed-capacity telemetry history backed by NumPy ring buffers.
+
+Each channel keeps preallocated timestamp and value arrays. Every sample is
+written twice, at ``i`` and ``i + capacity``, so the newest ``n`` samples
+are always one contiguous slice: windows are returned as zero-copy views
+and appends never allocate.
+"""
+import time
+
+import numpy as np
+
+# Eight hours at 2 samples per second
+DEFAULT_CAPACITY = 8 * 3600 * 2
+
+
+class ChannelBuffer:
+    """Circular buffer of (timestamp, value) samples for one channel."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, dtype=np.float64):
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        self._values = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0  # Index the next sample is written to
+        self.count = 0
+        self.total = 0  # Samples ever appended, including overwritten ones
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        """Add one sample in O(1), overwriting the oldest when full."""
+        head = self._head
+        mirror = head + self.capacity
+        self._times[head] = self._times[mirror] = timestamp
+        self._values[head] = self._values[mirror] = value
+        self._head = head + 1 if head + 1 < self.capacity else 0
+        if self.count < self.capacity:
+            self.count += 1
+        self.total += 1
+
+    def last(self, n=None):
+        """Return views of the newest ``n`` samples (all by default), oldest first."""
+        n = self.count if n is None else min(n, self.count)
+        end = self._head + self.capacity
+        return self._times[end - n:end], self._values[end - n:end]
+
+    def window(self, seconds, now=None):
+        """Return views of the samples from the last ``seconds`` seconds.
+
+        ``now`` defaults to the newest sample's timestamp.
+        """
+        times, values = self.last()
+        if not len(times):
+            return times, values
+        if now is None:
+            now = times[-1]
+        start = np.searchsorted(times, now - seconds, side='left')
+        return times[start:], values[start:]
+
+    def latest(self):
+        """Return the newest (timestamp, value), or None if empty."""
+        if not self.count:
+            return None
+        index = self._head - 1 + self.capacity
+        return self._times[index], self._values[index]
+
+
+class TelemetryHistory:
+    """A ChannelBuffer per telemetry channel, fed with parsed records."""
+
+    def __init__(self, channels=(), capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.channels = {name: ChannelBuffer(capacity) for name in channels}
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def __contains__(self, name):
+        return name in self.channels
+
+    def channel(self, name):
+        """Return the buffer for ``name``, creating it on first use."""
+        buffer = self.channels.get(name)
+        if buffer is None:
+            buffer = self.channels[name] = ChannelBuffer(self.capacity)
+        return buffer
+
+    def consume(self, records, timestamp=None, prefix="", times=None):
+        """Append a batch of records, all stamped with ``timestamp`` (default: now).
+
+        ``times`` gives each record its own sample time instead. ``prefix``
+        is prepended to the channel names, e.g. to keep raw samples next to
+        their filtered channel.
+        """
+        if times is None:
+            times = [time.monotonic() if timestamp is None else timestamp] * len(records)
+        for record, sampled in zip(records, times):
+            for name, value in record.items():
+                self.channel(prefix + name).append(sampled, value)
+
+    def window(self, name, seconds, now=None):
+        """Return (times, values) views of one channel over the last ``seconds``."""
+        return self.channel(name).window(seconds, now)
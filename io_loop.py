@@ -0,0 +1,255 @@
+"""One thread reading every device's serial port through a selector.
+
+Instead of a reader thread per port, ``SerialIOLoop`` waits on all ports
+at once with ``selectors`` and only wakes up when one of them has data, so
+serving many boards costs one mostly idle thread. Decoded records are
+published on a ``bus.EventBus`` under the device's name.
+
+Opening a port (with ``ports.PortOpener``'s retry and backoff) and the
+protocol negotiation block, so they run on a short-lived helper thread
+per device; the loop picks the connection up once it is ready. When a
+port fails the device is dropped from the selector, its codec resyncs and
+the helper opens it again, without stalling the other devices.
+
+Every record is published with the host ``time.monotonic()`` it was
+sampled at: the moment its bytes were read or, for a link with a
+``clock_sync.ClockSync``, the board's own ``@<millis>;`` stamp mapped onto
+the host clock. The loop also sends those links their ``SYNC:`` pings.
+"""
+import os
+import queue
+import selectors
+import threading
+import time
+
+import serial
+
+from profiling import PROFILER
+
+
+class DeviceLink:
+    """A device served by the loop: how to open it, its codec and its connection.
+
+    ``opener(stop_event)`` returns an open connection (or None once
+    stopped); without one, a failed connection is not reopened.
+    ``on_connect(connection)`` and ``on_disconnect()`` are called on the
+    helper and loop threads; like ``SerialReader.on_data`` they must not
+    touch widgets. ``clock`` (a ``ClockSync`` fed by the codec's
+    ``on_sync``) turns the board's timestamps into host times.
+
+    Other threads write to the board through ``write`` and ``flush``, so
+    commands and the loop's clock pings never interleave on the port.
+    """
+
+    def __init__(self, spec, codec, opener=None, negotiate=None, on_connect=None, on_disconnect=None,
+                 clock=None):
+        self.spec = spec
+        self.name = spec.name
+        self.codec = codec
+        self.initial_codec = codec
+        self.opener = opener
+        self.negotiate = negotiate
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.clock = clock
+        self.connection = None
+        self.connected = threading.Event()
+        self.received = 0  # Records published
+        self.disconnects = 0
+        self.last_time = 0.0  # Sample time of the newest record
+        self._write_lock = threading.Lock()
+
+    def write(self, data):
+        with self._write_lock:
+            connection = self.connection
+            if connection is None:
+                raise serial.SerialException(f"{self.name} board is not connected")
+            return connection.write(data)
+
+    def flush(self):
+        with self._write_lock:
+            if self.connection is not None:
+                self.connection.flush()
+
+    def detach(self):
+        """Forget the connection and return it, once no write is using it."""
+        with self._write_lock:
+            connection, self.connection = self.connection, None
+        return connection
+
+    def sample_times(self, count, received):
+        """Host time of each of the ``count`` records just decoded, read at ``received``.
+
+        Stamped records get their board time on the host clock once the
+        clock is synced. Times never go back and never pass ``received``, so
+        a new clock estimate cannot reorder a board's own samples.
+        """
+        clock = self.clock
+        last = self.last_time
+        if clock is None or self.codec.name != "text":
+            times = [max(received, last)] * count
+        else:
+            times = []
+            for stamp in self.codec.device_times:
+                sampled = clock.to_host(stamp) if stamp is not None else None
+                last = max(last, received if sampled is None else min(sampled, received))
+                times.append(last)
+        self.last_time = times[-1]
+        return times
+
+    def wants_ping(self):
+        """Whether the loop should keep this link's clock synced."""
+        return self.clock is not None and self.connection is not None and self.codec.name == "text"
+
+
+class SerialIOLoop(threading.Thread):
+    """Read all device links on one thread and publish their records on ``bus``."""
+
+    def __init__(self, bus, name="SerialIOLoop"):
+        super(SerialIOLoop, self).__init__(name=name, daemon=True)
+        self.bus = bus
+        self.links = {}
+        self._selector = selectors.DefaultSelector()
+        # Written to wake the selector when a link is ready or the loop should stop
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+        self._selector.register(self._wake_read, selectors.EVENT_READ, None)
+        self._opened = queue.SimpleQueue()  # Links connected by their helper threads
+        self._stop_event = threading.Event()
+
+    def add(self, link, connection=None):
+        """Serve ``link``, opening its port in the background unless ``connection`` is given."""
+        self.links[link.name] = link
+        self._connect_in_background(link, connection)
+
+    def _connect_in_background(self, link, connection=None):
+        threading.Thread(target=self._connect, args=(link, connection), name=f"{link.name}-connect",
+                         daemon=True).start()
+
+    def _connect(self, link, connection):
+        if connection is None:
+            connection = link.opener(self._stop_event)
+            if connection is None:
+                return  # Stopped before the port could be opened
+        if link.negotiate is not None:
+            try:
+                codec = link.negotiate(connection)
+            except (serial.SerialException, OSError) as e:
+                print(f"Error negotiating protocol with {link.name}: {e}")
+                codec = None
+            if codec is not None:
+                link.codec = codec
+        link.connection = connection
+        link.connected.set()
+        if link.on_connect is not None:
+            link.on_connect(connection)
+        self._opened.put(link)
+        self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            pass  # Already awake
+
+    def run(self):
+        while not self._stop_event.is_set():
+            for key, events in self._selector.select(self._ping_timeout()):
+                if key.data is None:
+                    try:
+                        os.read(self._wake_read, 4096)
+                    except BlockingIOError:
+                        pass
+                    self._register_opened()
+                else:
+                    self._read(key.data)
+            self._ping_due()
+
+    def _ping_timeout(self):
+        """Seconds until the next clock ping is due (None: no link needs one)."""
+        due = [link.clock.next_ping() for link in self.links.values() if link.wants_ping()]
+        return max(0.0, min(due) - time.monotonic()) if due else None
+
+    def _ping_due(self):
+        now = time.monotonic()
+        for link in self.links.values():
+            if link.wants_ping() and link.clock.next_ping() <= now:
+                try:
+                    link.write(link.clock.request(now))
+                    link.flush()
+                except (serial.SerialException, OSError):
+                    pass  # The read side notices the failure and reconnects
+
+    def _register_opened(self):
+        while True:
+            try:
+                link = self._opened.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._selector.register(link.connection, selectors.EVENT_READ, link)
+            except (ValueError, OSError) as e:
+                self._disconnected(link, e)
+
+    def _read(self, link):
+        connection = link.connection
+        profiling = PROFILER.enabled
+        if profiling:
+            start = time.perf_counter()
+        try:
+            data = connection.read(connection.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self._disconnected(link, e)
+            return
+        received = time.monotonic()
+        if not data:
+            return
+        if profiling:
+            read = time.perf_counter()
+            PROFILER.add_time("read", read - start)
+        records = link.codec.feed(data)
+        if profiling:
+            PROFILER.add_time("decode", time.perf_counter() - read)
+        if not records:
+            return
+        prefix = link.spec.prefix
+        if prefix:
+            records = [{prefix + name: value for name, value in record.items()} for record in records]
+        times = link.sample_times(len(records), received)
+        if profiling and link.clock is not None and link.clock.synced:
+            for sampled in times:
+                PROFILER.add_time("serial latency", received - sampled)
+        link.received += len(records)
+        self.bus.publish(link.name, records, times)
+
+    def _disconnected(self, link, error):
+        """Drop a failed port and open it again in the background."""
+        if self._stop_event.is_set():
+            return
+        print(f"Error reading from {link.name}: {error}")
+        try:
+            self._selector.unregister(link.connection)
+        except (KeyError, ValueError):
+            pass
+        link.disconnects += 1
+        link.connected.clear()
+        connection = link.detach()
+        try:
+            connection.close()
+        except (serial.SerialException, OSError):
+            pass
+        # A reset firmware talks text again, and the first bytes may start mid-line
+        link.codec = link.initial_codec
+        link.codec.resync()
+        if link.clock is not None:
+            link.clock.reset()  # A reset board's millis() starts again from zero
+        if link.on_disconnect is not None:
+            link.on_disconnect()
+        if link.opener is not None:
+            self._connect_in_background(link)
+
+    def stop(self):
+        """Stop the loop and any helper still waiting for a port."""
+        self._stop_event.set()
+        self._wake()
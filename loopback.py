@@ -0,0 +1,189 @@
+"""In-memory stand-in for the Arduinos, for benchmarks and tests without hardware.
+
+``LoopbackArduino`` implements the parts of the ``serial.Serial`` interface
+the GUI uses (``in_waiting``, ``read``, ``readline``, ``write``, ``flush``,
+``close``, ``is_open``, and ``fileno`` for selectors). Bytes written by the
+host are interpreted the way the firmware would, and ``send`` queues
+telemetry for the host to read in whichever protocol has been negotiated.
+"""
+import os
+import random
+import threading
+import time
+
+from binary_protocol import (BinaryCodec, COMMAND_FRAMES, SENSOR_FRAME, BLOOD_FLOW_FRAME, ACK_FRAME,
+                             NEGOTIATE_REQUEST, NEGOTIATE_ACK)
+from telemetry import (ACK_PREFIX, SYNC_PREFIX, TIME_PREFIX, TIME_SEPARATOR, PRESSURE_KEYS, LineFramer,
+                       format_sensor_line, format_pump_line, format_named_line)
+
+
+class LoopbackArduino:
+    """Fake serial port backed by a firmware emulation.
+
+    ``kind`` is ``"sensor"`` (CSV sensor board), ``"pump"`` (``BFR:`` blood
+    pump board) or ``"pressure"`` (``PIN:``/``POUT:``, text only). With
+    ``binary_capable=False`` the emulated firmware behaves like the old
+    text-only sketches and ignores ``P:BIN``; with ``acknowledges=False``
+    it does not confirm commands with ``ACK:``.
+    With ``timestamps=True`` it answers ``SYNC:`` pings and stamps its text
+    lines with a ``millis()`` clock that started at a random time and runs
+    ``clock_rate`` times as fast as the host's.
+    """
+
+    def __init__(self, kind="sensor", binary_capable=True, acknowledges=True, timeout=1, timestamps=False,
+                 clock_rate=1.0):
+        self.kind = kind
+        self.binary_capable = binary_capable
+        self.acknowledges = acknowledges
+        self.timestamps = timestamps
+        self.clock_rate = clock_rate
+        self._clock_start = time.monotonic() - random.uniform(0, 3600)
+        self.timeout = timeout
+        self.is_open = True
+        self.binary = False
+        self.commands = []  # (prefix, value) setpoints received from the host
+        self._rx = bytearray()  # Bytes waiting for the host to read
+        self._cond = threading.Condition()
+        self._framer = LineFramer()
+        self._command_codec = BinaryCodec(COMMAND_FRAMES)
+        self._telemetry_codec = BinaryCodec()
+        # A pipe holding one byte while there is data to read, so selectors can watch the port
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+
+    # Host side: serial.Serial interface
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def read(self, size=1):
+        with self._cond:
+            if not self._rx and self.timeout != 0:
+                self._cond.wait_for(lambda: self._rx or not self.is_open, self.timeout)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            self._update_wake()
+            return data
+
+    def readline(self):
+        deadline = time.monotonic() + (self.timeout or 0)
+        with self._cond:
+            while True:
+                index = self._rx.find(b"\n")
+                if index >= 0:
+                    data = bytes(self._rx[:index + 1])
+                    del self._rx[:index + 1]
+                    self._update_wake()
+                    return data
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.is_open:
+                    data = bytes(self._rx)
+                    self._rx.clear()
+                    self._update_wake()
+                    return data
+                self._cond.wait(remaining)
+
+    def write(self, data):
+        if self.binary:
+            for record in self._command_codec.feed(data):
+                for prefix, value in record.items():
+                    self._command(prefix, value)
+        else:
+            for line in self._framer.feed(data):
+                self._handle_line(line)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._rx.clear()
+            self._update_wake()
+
+    def fileno(self):
+        return self._wake_read
+
+    def close(self):
+        with self._cond:
+            if not self.is_open:
+                return
+            self.is_open = False
+            self._cond.notify_all()
+            os.close(self._wake_read)
+            os.close(self._wake_write)
+
+    def _update_wake(self):
+        """Empty the wake pipe once everything has been read (called with the lock held)."""
+        if not self._rx and self.is_open:
+            try:
+                os.read(self._wake_read, 64)
+            except BlockingIOError:
+                pass
+
+    # Firmware side
+
+    def _handle_line(self, line):
+        if line == NEGOTIATE_REQUEST.decode().strip():
+            if self.binary_capable:
+                self._push(NEGOTIATE_ACK)
+                self.binary = True
+            return
+        if self.timestamps and line.startswith(SYNC_PREFIX):
+            self._push(f"{line},{self.millis()}\n".encode('utf-8'))
+            return
+        prefix, _, value = line.partition(':')
+        if value:
+            try:
+                self._command(prefix, float(value))
+            except ValueError:
+                pass
+
+    def _command(self, prefix, value):
+        self.commands.append((prefix, value))
+        if not self.acknowledges:
+            return
+        with self._cond:
+            if self.binary:
+                spec = self._command_codec.commands[prefix]
+                self._push(self._telemetry_codec.encode(ACK_FRAME, {"frame_type": spec.frame_type}))
+            else:
+                self._push(f"{ACK_PREFIX}{prefix}\n".encode('utf-8'))
+
+    def _push(self, data):
+        with self._cond:
+            if not data or not self.is_open:
+                return
+            if not self._rx:
+                os.write(self._wake_write, b"\0")
+            self._rx += data
+            self._cond.notify_all()
+
+    def millis(self):
+        """The emulated firmware's ``millis()``."""
+        return int((time.monotonic() - self._clock_start) * self.clock_rate * 1000) % 2 ** 32
+
+    def encode(self, record):
+        """Encode one telemetry record in the currently negotiated protocol."""
+        if self.timestamps and not self.binary:
+            line = self._encode(record)
+            return f"{TIME_PREFIX}{self.millis()}{TIME_SEPARATOR}".encode('utf-8') + line
+        return self._encode(record)
+
+    def _encode(self, record):
+        if self.kind == "pressure":
+            return format_named_line(record, PRESSURE_KEYS).encode('utf-8')
+        if self.kind == "sensor":
+            if self.binary:
+                return self._telemetry_codec.encode(SENSOR_FRAME, record)
+            return format_sensor_line(record).encode('utf-8')
+        if self.binary:
+            return self._telemetry_codec.encode(BLOOD_FLOW_FRAME, record)
+        return format_pump_line(record).encode('utf-8')
+
+    def send(self, *records):
+        """Queue telemetry records for the host to read."""
+        # Encode under the lock so frame sequence numbers stay in order
+        with self._cond:
+            self._push(b"".join(self.encode(record) for record in records))
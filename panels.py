@@ -0,0 +1,85 @@
+"""Lightweight dashboard panels drawn on a single canvas.
+
+A ``DataPanel`` is one widget that draws its title, value(s) and unit as
+textures on its own canvas, instead of a ``BoxLayout`` holding a ``Label``
+per text (and another ``BoxLayout`` for inlet/outlet pairs). The dashboard
+then has one widget per panel and no nested layouts to lay out, and a
+value change re-renders only that value's texture.
+"""
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, Rectangle
+from kivy.uix.widget import Widget
+
+TITLE_FONT_SIZE = 16
+VALUE_FONT_SIZE = 32
+PAIRED_VALUE_FONT_SIZE = 15  # Kivy's default Label size, as the old Inlet/Outlet labels used
+UNIT_FONT_SIZE = 16
+
+
+class PanelText:
+    """One text drawn at a fixed relative position of a panel.
+
+    It has the ``text`` attribute of a ``Label``, so ``display.DisplayBinding``
+    can drive it; assigning ``text`` re-renders only this texture.
+    """
+
+    def __init__(self, panel, text, anchor, font_size, bold=False):
+        self.panel = panel
+        self.anchor = anchor  # Center of the text as fractions of the panel's width and height
+        self.rectangle = Rectangle()
+        self._core = CoreLabel(text=text, font_size=font_size, bold=bold, halign="center")
+        self._text = None
+        self.text = text
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        if text == self._text:
+            return
+        self._text = text
+        self._core.text = text
+        self._core.refresh()
+        texture = self._core.texture
+        self.rectangle.texture = texture
+        self.rectangle.size = texture.size
+        self.place()
+
+    def place(self):
+        """Center the text on its anchor point."""
+        panel = self.panel
+        width, height = self.rectangle.size
+        self.rectangle.pos = (int(panel.x + panel.width * self.anchor[0] - width / 2),
+                              int(panel.y + panel.height * self.anchor[1] - height / 2))
+
+
+class DataPanel(Widget):
+    """Panel with a title, one value (or several side by side) and a unit.
+
+    ``values`` are the initial value texts. The ``PanelText`` of each is in
+    ``value_texts``; ``value_label`` is the first one.
+    """
+
+    def __init__(self, title, unit, values=("",), **kwargs):
+        super(DataPanel, self).__init__(**kwargs)
+        # Same rows as the old vertical BoxLayout: title, value, unit
+        self.title = PanelText(self, title, (0.5, 5 / 6.0), TITLE_FONT_SIZE)
+        if len(values) == 1:
+            self.value_texts = [PanelText(self, values[0], (0.5, 0.5), VALUE_FONT_SIZE, bold=True)]
+        else:
+            self.value_texts = [PanelText(self, text, ((index + 0.5) / len(values), 0.5), PAIRED_VALUE_FONT_SIZE)
+                                for index, text in enumerate(values)]
+        self.unit = PanelText(self, unit, (0.5, 1 / 6.0), UNIT_FONT_SIZE)
+        self.value_label = self.value_texts[0]
+        self._texts = [self.title] + self.value_texts + [self.unit]
+        with self.canvas:
+            Color(1, 1, 1, 1)
+        for text in self._texts:
+            self.canvas.add(text.rectangle)
+        self.bind(pos=self._place, size=self._place)
+
+    def _place(self, *args):
+        for text in self._texts:
+            text.place()
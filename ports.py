@@ -0,0 +1,116 @@
+"""Finding and opening the Arduinos' serial ports without blocking the UI.
+
+``PortOpener`` is called on a reader thread. It opens the configured
+device path and retries with exponential backoff until the port opens or
+the reader is stopped. A board given USB vendor/product ids or a serial
+number that only it has is also looked up by them, so it is found even
+when it enumerates as another ``/dev/ttyACM*``. The sensor and pump
+Arduinos are usually the same model, so the shared ``ARDUINO_USB_IDS``
+alone would let them swap ports; probing a port to tell them apart is not
+an option either, since opening an Arduino's port resets it. Ports opened
+by one board are not offered to the other.
+"""
+import threading
+
+import serial
+
+# USB (vendor, product) ids of the boards the firmware runs on:
+# Arduino Uno and Mega 2560 (both vendor ids) and CH340 based clones
+ARDUINO_USB_IDS = (
+    (0x2341, 0x0043), (0x2341, 0x0042), (0x2341, 0x0010),
+    (0x2A03, 0x0043), (0x2A03, 0x0042),
+    (0x1A86, 0x7523),
+)
+
+_claimed = set()  # Devices currently opened by a PortOpener
+_claimed_lock = threading.Lock()
+
+
+def parse_usb_ids(text):
+    """Parse ``"2341:0043,1a86:7523"`` into ((0x2341, 0x0043), (0x1a86, 0x7523))."""
+    ids = []
+    for item in text.split(","):
+        if item.strip():
+            vid, _, pid = item.strip().partition(":")
+            ids.append((int(vid, 16), int(pid, 16)))
+    return tuple(ids)
+
+
+def find_ports(usb_ids, serial_number=None):
+    """Return the devices of connected USB serial ports matching ``usb_ids`` (and ``serial_number``)."""
+    from serial.tools import list_ports  # Scans sysfs, only needed once a port is wanted
+    return sorted(port.device for port in list_ports.comports()
+                  if (port.vid, port.pid) in usb_ids and serial_number in (None, port.serial_number))
+
+
+class PortOpener:
+    """Open one board's serial port on the calling (background) thread.
+
+    Call it with a ``threading.Event``; it returns the open connection, or
+    None if the event was set before a port could be opened. Ports are only
+    looked up by ``usb_ids`` (any Arduino if only ``serial_number`` is
+    given) when one of them is set; they must identify this board alone.
+    """
+
+    def __init__(self, fallback, usb_ids=None, baudrate=9600, timeout=1,
+                 initial_delay=0.5, max_delay=10.0, name=None, serial_number=None):
+        self.fallback = fallback
+        self.usb_ids = usb_ids
+        self.serial_number = serial_number
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.name = name or fallback
+        self.attempts = 0
+        self.device = None  # Device of the open connection
+
+    def candidates(self):
+        """Devices to try: matching ports (the configured one first), then the configured one."""
+        found = []
+        if self.usb_ids or self.serial_number is not None:
+            try:
+                found = find_ports(self.usb_ids or ARDUINO_USB_IDS, self.serial_number)
+            except OSError:
+                pass
+        with _claimed_lock:
+            devices = sorted((device for device in found if device not in _claimed),
+                             key=lambda device: device != self.fallback)
+        if self.fallback not in devices:
+            devices.append(self.fallback)
+        return devices
+
+    def __call__(self, stop_event):
+        if self.device is not None:
+            self.release()  # Reopening after a disconnect
+        delay = self.initial_delay
+        while not stop_event.is_set():
+            self.attempts += 1
+            errors = []
+            for device in self.candidates():
+                with _claimed_lock:
+                    if device in _claimed:
+                        continue
+                    _claimed.add(device)
+                try:
+                    connection = serial.Serial(device, baudrate=self.baudrate, timeout=self.timeout)
+                except (serial.SerialException, OSError, ValueError) as e:
+                    self.release(device)
+                    errors.append(f"{device}: {e}")
+                    continue
+                self.device = device
+                return connection
+            if self.attempts == 1 or delay >= self.max_delay:
+                print(f"Waiting for {self.name} ({'; '.join(errors) or 'no port found'}), "
+                      f"retrying in {delay:.1f} s")
+            stop_event.wait(delay)
+            delay = min(delay * 2, self.max_delay)
+        return None
+
+    def release(self, device=None):
+        """Let other boards use the device again, e.g. after it was closed."""
+        device = device or self.device
+        with _claimed_lock:
+            _claimed.discard(device)
+        if device == self.device:
+            self.device = None
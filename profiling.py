@@ -0,0 +1,162 @@
+"""Optional timing instrumentation of the telemetry path.
+
+``PROFILER`` collects, per stage, a histogram of how long each call took
+(serial read, decode, parse, filter, UI apply, label flush, ...), plus
+counters, sampled gauges such as queue depths, and the frame time. Call
+sites check ``PROFILER.enabled`` before taking a timestamp, so while it is
+off (the default) the cost is one attribute lookup per call::
+
+    if PROFILER.enabled:
+        start = time.perf_counter()
+        records = codec.feed(data)
+        PROFILER.add_time("decode", time.perf_counter() - start)
+
+Set ``ECMO_PROFILE=1`` to profile from the start. Stages are updated from
+the I/O and UI threads without a lock; a sample may occasionally be lost,
+which is fine for statistics.
+"""
+import json
+import math
+import os
+import time
+
+BUCKETS_PER_OCTAVE = 4  # Bucket bounds grow by 2 ** (1 / 4), about 19%
+BUCKETS = 40 * BUCKETS_PER_OCTAVE
+
+
+class Histogram:
+    """Positive values (durations in ``unit`` seconds by default) in logarithmic buckets."""
+
+    def __init__(self, unit=1e-6):
+        self.unit = unit
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        scaled = value / self.unit
+        index = int(math.log2(scaled) * BUCKETS_PER_OCTAVE) + 1 if scaled >= 1 else 0
+        self.counts[min(index, BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the ``fraction`` quantile (None when empty)."""
+        if not self.count:
+            return None
+        wanted = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted and count:
+                return min(2 ** (index / BUCKETS_PER_OCTAVE) * self.unit, self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.total / self.count, "p50": self.percentile(0.5),
+                "p95": self.percentile(0.95), "p99": self.percentile(0.99), "max": self.max,
+                # [upper bound, count] of every non-empty bucket, for offline plots
+                "buckets": [[2 ** (index / BUCKETS_PER_OCTAVE) * self.unit, count]
+                            for index, count in enumerate(self.counts) if count]}
+
+
+class Profiler:
+    """Stage timings, counters and gauges of one run; collects nothing while disabled.
+
+    ``watch(name, read)`` registers a counter kept elsewhere (e.g. the bus's
+    dropped batches); it is read when a snapshot is taken.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}  # Stage -> Histogram of seconds per call
+        self.gauges = {}  # Name -> Histogram of sampled values
+        self.counters = {}
+        self.watched = {}  # Name -> callable returning a count
+        self.since = time.monotonic()
+
+    def add_time(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.add(seconds)
+
+    def sample(self, name, value):
+        """Record a sampled value such as a queue depth."""
+        histogram = self.gauges.get(name)
+        if histogram is None:
+            histogram = self.gauges[name] = Histogram(unit=1)
+        histogram.add(value)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def watch(self, name, read):
+        self.watched[name] = read
+
+    def timed(self, stage, function):
+        """Wrap ``function`` so its calls are timed as ``stage`` while enabled."""
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add_time(stage, time.perf_counter() - start)
+        return wrapper
+
+    def reset(self):
+        self.stages.clear()
+        self.gauges.clear()
+        self.counters.clear()
+        self.since = time.monotonic()
+
+    def snapshot(self):
+        """Everything collected so far as plain data."""
+        counters = dict(self.counters)
+        for name, read in self.watched.items():
+            counters[name] = read()
+        return {
+            "enabled": self.enabled,
+            "seconds": time.monotonic() - self.since,
+            "stages_s": {name: histogram.summary() for name, histogram in sorted(self.stages.items())},
+            "gauges": {name: histogram.summary() for name, histogram in sorted(self.gauges.items())},
+            "counters": counters,
+        }
+
+    def report(self):
+        """Return the snapshot as a table (times in microseconds)."""
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<16}{'calls':>8}{'mean':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>9}"]
+        for name, summary in snapshot["stages_s"].items():
+            if summary["count"]:
+                times = "".join(f"{summary[key] * 1e6:>8.0f}" for key in ("mean", "p50", "p95", "p99"))
+                lines.append(f"{name:<16}{summary['count']:>8}{times}{summary['max'] * 1e6:>9.0f}")
+        for name, summary in snapshot["gauges"].items():
+            if summary["count"]:
+                lines.append(f"{name:<16}{summary['count']:>8}{summary['mean']:>8.1f}{summary['p50']:>8.0f}"
+                             f"{summary['p95']:>8.0f}{summary['p99']:>8.0f}{summary['max']:>9.0f}")
+        for name, value in snapshot["counters"].items():
+            lines.append(f"{name:<16}{value:>8}")
+        lines.append(f"over {snapshot['seconds']:.0f} s{'' if self.enabled else ' (paused)'}")
+        return "\n".join(lines)
+
+    def export(self, path):
+        """Save the snapshot as JSON for offline analysis."""
+        snapshot = self.snapshot()
+        snapshot["created"] = time.time()
+        with open(path, "w") as output:
+            json.dump(snapshot, output, indent=2)
+        return path
+
+
+PROFILER = Profiler(enabled=bool(os.environ.get("ECMO_PROFILE")))
@@ -0,0 +1,205 @@
+"""Append-only session log of everything that happens during an ECMO run.
+
+File layout::
+
+    magic (8 bytes) | JSON header padded to HEADER_SIZE | fixed-width records...
+
+Every record is a ``RECORD_DTYPE`` row (time, value, channel id, kind,
+flags). The header maps channel ids to names and is rewritten in place when
+a new channel shows up; the record area is only ever appended to. Records
+are written from a background thread in large chunks, and a finished (or
+still running) session is read back with ``numpy.memmap`` without parsing.
+"""
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"ECMOLOG1"
+HEADER_SIZE = 4096  # Bytes reserved for magic + JSON header
+
+RECORD_DTYPE = np.dtype([
+    ("time", "<f8"),  # Host time.monotonic() the value was sampled at
+    ("value", "<f8"),
+    ("channel", "<u2"),  # Index into the header's channel list
+    ("kind", "u1"),
+    ("flags", "u1"),
+])
+
+# Record kinds
+SAMPLE = 0  # Parsed sensor / pump reading
+COMMAND = 1  # Setpoint change or command sent to an Arduino
+ALARM = 2  # Alarm raised (value 1) or cleared (value 0), channel "alarm:<name>"
+FILTERED = 3  # Output of the dsp filters, same channel names as the raw SAMPLE rows
+DERIVED = 4  # Metrics computed from other channels, see derived.py
+
+SESSION_SUFFIX = ".ecmolog"
+
+
+def session_path(directory="sessions"):
+    """Return a new timestamped session file path in ``directory``."""
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(directory, f"ecmo-{stamp}{SESSION_SUFFIX}")
+
+
+class SessionRecorder(threading.Thread):
+    """Record parsed records and commands to a session log on a background thread.
+
+    ``record`` and ``record_command`` are called on the UI thread and only
+    queue rows; the writer thread batches them into ``chunk_records``-sized
+    writes, or writes what it has every ``flush_interval`` seconds.
+
+    At most ``max_pending`` batches wait for the writer; records that do not
+    fit are counted in ``dropped``. If writing fails (the disk is full, or
+    the channel table outgrew ``HEADER_SIZE``) the error is kept in
+    ``error`` and later records are dropped as well, so a dead writer never
+    lets the queue grow.
+    """
+
+    def __init__(self, path, chunk_records=4096, flush_interval=1.0, max_pending=1024):
+        super(SessionRecorder, self).__init__(name="SessionRecorder", daemon=True)
+        self.path = path
+        self.chunk_records = chunk_records
+        self.flush_interval = flush_interval
+        self.channel_ids = {}
+        self.channel_names = []  # Only appended to, read by the writer thread
+        self.records_written = 0
+        self.dropped = 0
+        self.error = None
+        self._channel_count = 0  # Channels listed in the header on disk
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop_event = threading.Event()
+        self._header = {
+            "version": 1,
+            "started": datetime.datetime.now().isoformat(timespec="seconds"),
+            # Lets readers convert monotonic record times to wall-clock time
+            "monotonic_start": time.monotonic(),
+            "wall_start": time.time(),
+            "record_dtype": RECORD_DTYPE.descr,
+        }
+
+    @property
+    def pending(self):
+        """Batches queued for the writer thread."""
+        return self._queue.qsize()
+
+    def _channel_id(self, name):
+        channel_id = self.channel_ids.get(name)
+        if channel_id is None:
+            channel_id = self.channel_ids[name] = len(self.channel_names)
+            self.channel_names.append(name)
+        return channel_id
+
+    def record(self, records, timestamp=None, kind=SAMPLE, times=None):
+        """Queue a batch of parsed records, all stamped with ``timestamp`` (default: now).
+
+        ``times`` gives each record its own sample time instead.
+        """
+        if times is None:
+            times = [time.monotonic() if timestamp is None else timestamp] * len(records)
+        rows = [(sampled, value, self._channel_id(name), kind, 0)
+                for record, sampled in zip(records, times) for name, value in record.items()]
+        if not rows:
+            return
+        if self.error is not None:
+            self.dropped += len(rows)
+            return
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            self.dropped += len(rows)
+
+    def record_command(self, name, value, timestamp=None):
+        """Queue a setpoint change or a command sent to an Arduino."""
+        self.record([{name: value}], timestamp, kind=COMMAND)
+
+    def run(self):
+        try:
+            self._write_session()
+        except (ValueError, OSError) as e:
+            self.error = e
+            print(f"Session recording stopped: {e}")
+
+    def _write_session(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "wb") as log:
+            self._channel_count = self._write_header(log)
+            pending = []
+            deadline = time.monotonic() + self.flush_interval
+            while not (self._stop_event.is_set() and self._queue.empty()):
+                try:
+                    pending.extend(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    pass
+                if len(pending) >= self.chunk_records or time.monotonic() >= deadline:
+                    self._write_rows(log, pending)
+                    pending = []
+                    deadline = time.monotonic() + self.flush_interval
+            self._write_rows(log, pending)
+
+    def _write_rows(self, log, rows):
+        if not rows:
+            return
+        if len(self.channel_names) != self._channel_count:
+            self._channel_count = self._write_header(log)
+        log.write(np.array(rows, dtype=RECORD_DTYPE).tobytes())
+        log.flush()
+        self.records_written += len(rows)
+
+    def _write_header(self, log):
+        """Write the magic and JSON header at the start of the file; return the channel count."""
+        channels = list(self.channel_names)
+        header = json.dumps(dict(self._header, channels=channels)).encode('utf-8')
+        if len(MAGIC) + len(header) > HEADER_SIZE:
+            raise ValueError(f"Session header with {len(channels)} channels does not fit in HEADER_SIZE")
+        position = log.tell()
+        log.seek(0)
+        log.write(MAGIC + header.ljust(HEADER_SIZE - len(MAGIC), b" "))
+        log.seek(max(position, HEADER_SIZE))
+        return len(channels)
+
+    def close(self, timeout=5):
+        """Write everything still queued and stop the writer thread."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+class SessionLog:
+    """A recorded session opened with ``numpy.memmap``.
+
+    ``records`` is a read-only structured array over the file; a trailing
+    partial record (e.g. after a power loss) is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as log:
+            block = log.read(HEADER_SIZE)
+        if not block.startswith(MAGIC):
+            raise ValueError(f"{path} is not an ECMO session log")
+        self.header = json.loads(block[len(MAGIC):].decode('utf-8'))
+        self.channels = self.header["channels"]
+        count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if count > 0:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def channel(self, name, kind=SAMPLE):
+        """Return (times, values) arrays of one channel."""
+        channel_id = self.channels.index(name)
+        mask = (self.records["channel"] == channel_id) & (self.records["kind"] == kind)
+        selected = self.records[mask]
+        return selected["time"], selected["value"]
+
+    def wall_time(self, times):
+        """Convert recorded monotonic times to UNIX wall-clock times."""
+        return times - self.header["monotonic_start"] + self.header["wall_start"]
@@ -0,0 +1,78 @@
+"""Background serial reader for ECMO-Touchscreen.py.
+
+The port gets its own daemon thread that blocks on it and drains
+everything the Arduino has sent, so the Kivy UI thread never waits on I/O
+and readings never fall behind the firmware's send rate. test1101.py reads
+its boards through ``io_loop.SerialIOLoop`` instead, which also reopens
+ports and negotiates the protocol.
+"""
+import collections
+import threading
+
+import serial
+
+
+class SerialReader(threading.Thread):
+    """Read and decode everything from one serial connection into a bounded queue.
+
+    Each wake-up reads all of ``in_waiting`` with a single ``read()`` and
+    hands it to ``codec`` (see ``telemetry.TextCodec`` and
+    ``binary_protocol.BinaryCodec``), which returns the complete records.
+
+    ``on_data`` is called from the reader thread whenever new records have
+    been queued. It must not touch widgets; it should only schedule work on
+    the UI thread (e.g. with ``Clock.schedule_once``).
+    """
+
+    def __init__(self, connection, codec, on_data=None, maxlen=4096, name=None):
+        super(SerialReader, self).__init__(name=name or "SerialReader", daemon=True)
+        self.connection = connection
+        self.codec = codec
+        self.on_data = on_data
+        # deque.append/popleft are atomic, so producer and consumer need no lock.
+        # When the UI falls behind the oldest records are discarded.
+        self.records = collections.deque(maxlen=maxlen)
+        self.dropped = 0
+        self._stop_event = threading.Event()
+
+    def read_batch(self):
+        """Read whatever is buffered, blocking up to the port timeout for the first byte."""
+        data = self.connection.read(self.connection.in_waiting or 1)
+        if data:
+            waiting = self.connection.in_waiting
+            if waiting:
+                data += self.connection.read(waiting)
+        return data
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                data = self.read_batch()
+            except (serial.SerialException, OSError) as e:
+                if not self._stop_event.is_set():
+                    print(f"Error reading from {self.name}: {e}")
+                break
+            if not data:
+                continue  # Read timed out, check the stop flag again
+            records = self.codec.feed(data)
+            if not records:
+                continue
+            overflow = len(self.records) + len(records) - self.records.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self.records.extend(records)
+            if self.on_data is not None:
+                self.on_data()
+
+    def drain(self):
+        """Return and remove every queued record, oldest first."""
+        records = []
+        while True:
+            try:
+                records.append(self.records.popleft())
+            except IndexError:
+                return records
+
+    def stop(self):
+        """Ask the thread to exit after the current read returns."""
+        self._stop_event.set()
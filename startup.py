@@ -0,0 +1,71 @@
+"""Fast-boot helpers: lazy module imports and a startup-time report.
+
+``lazy_import`` returns a stand-in for a module that is only imported on
+first attribute access, so NumPy-backed modules (history, trends,
+recorder, alarms, transports) cost nothing until the pipeline is started
+after the first frame. ``StartupTimer`` records named milestones relative to process
+start and prints them as they happen::
+
+    Startup: first frame after 412 ms
+"""
+import importlib
+import json
+import time
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    ``importlib.import_module`` holds the import lock, so the first access
+    may come from any thread (``importlib.util.LazyLoader`` is not safe
+    for that before Python 3.12).
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+
+def lazy_import(name):
+    """Import ``name`` on first attribute access instead of now."""
+    return LazyModule(name)
+
+
+class StartupTimer:
+    """Milestones of one start, in seconds since the timer was created.
+
+    Create it before the first heavy import. ``mark`` is safe to call from
+    any thread; each milestone is only recorded the first time.
+    """
+
+    def __init__(self, verbose=True):
+        self.start = time.perf_counter()
+        self.verbose = verbose
+        self.marks = {}  # Milestone -> seconds since start, in order
+
+    def mark(self, name):
+        if name in self.marks:
+            return
+        elapsed = self.marks[name] = time.perf_counter() - self.start
+        if self.verbose:
+            print(f"Startup: {name} after {elapsed * 1000:.0f} ms")
+
+    def report(self):
+        """Return the milestones as a table, with the time each one added."""
+        lines = [f"{'milestone':<28}{'ms':>8}{'+ms':>8}"]
+        previous = 0.0
+        for name, elapsed in sorted(self.marks.items(), key=lambda item: item[1]):
+            lines.append(f"{name:<28}{elapsed * 1000:>8.0f}{(elapsed - previous) * 1000:>8.0f}")
+            previous = elapsed
+        return "\n".join(lines)
+
+    def write(self, path):
+        """Save the milestones as JSON, e.g. to compare boots on the target board."""
+        with open(path, "w") as output:
+            json.dump({"created": time.time(), "marks_s": self.marks}, output, indent=2)
@@ -0,0 +1,67 @@
+"""Minimal remote monitor for the telemetry stream of ``stream_server.py``.
+
+Run ``python stream_client.py HOST:PORT`` to print the values as they
+arrive, e.g. ``python stream_client.py 192.168.1.20:8765 --interval 1``.
+``StreamState`` rebuilds the full set of values from the delta messages
+and is also used by ``bench_stream.py``.
+"""
+import argparse
+import asyncio
+import json
+
+from stream_server import DEFAULT_PORT, parse_address
+
+
+class StreamState:
+    """The current values of a stream, rebuilt from its messages."""
+
+    def __init__(self):
+        self.values = {}
+        self.seq = 0
+        self.messages = 0
+        self.snapshots = 0  # Full messages, the first one plus one per overflow
+        self.skipped = 0  # Broadcasts the server dropped or merged for this client
+
+    def apply(self, line):
+        """Apply one message line; return the message."""
+        message = json.loads(line)
+        if message["full"]:
+            self.values = dict(message["values"])
+            self.snapshots += 1
+        else:
+            self.values.update(message["values"])
+        if self.seq and message["seq"] > self.seq + 1:
+            self.skipped += message["seq"] - self.seq - 1
+        self.seq = max(self.seq, message["seq"])
+        self.messages += 1
+        return message
+
+
+async def follow(host, port, interval=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    if interval is not None:
+        writer.write((json.dumps({"interval": interval}) + "\n").encode("utf-8"))
+    state = StreamState()
+    while True:
+        line = await reader.readline()
+        if not line:
+            print("Server closed the connection")
+            return
+        message = state.apply(line)
+        shown = " ".join(f"{name}={value}" for name, value in sorted(message["values"].items()))
+        print(f"#{message['seq']}{' (full)' if message['full'] else ''} {shown}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("address", nargs="?", default=f"127.0.0.1:{DEFAULT_PORT}", help="server HOST:PORT")
+    parser.add_argument("--interval", type=float, help="seconds between updates (default: server rate)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(follow(*parse_address(args.address), interval=args.interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
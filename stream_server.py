@@ -0,0 +1,228 @@
+"""Stream live telemetry to remote monitors over TCP.
+
+``TelemetryServer`` runs an asyncio server on its own thread. The UI only
+hands it the newest values (``publish`` merges them into a dict under a
+lock and returns), and the server sends them to every connected client
+as newline-delimited JSON messages::
+
+    {"seq": 1, "time": 1697.52, "full": true, "values": {"temperature1": 36.6, ...}}
+    {"seq": 2, "time": 1697.62, "full": false, "values": {"temperature1": 36.7}}
+
+Messages go out at most once per snapshot interval and, after the first
+(full) one, only carry the channels that changed (delta encoding). A
+client may ask for a slower rate by sending ``{"interval": 1.0}``; its
+deltas are merged until it is due. Every client has a small bounded send
+queue: when a slow client lets it fill up, or its oldest message has
+waited longer than ``max_lag``, the queued deltas are dropped and replaced
+by one full snapshot, so it skips ahead instead of slowing the server, the
+serial ingestion or the touchscreen. The kernel is only allowed a little
+unsent data per client, so little that is stale can hide from the queue
+there.
+"""
+import asyncio
+import json
+import math
+import socket
+import threading
+import time
+
+from telemetry import latest_values
+
+DEFAULT_PORT = 8765
+SOCKET_BUFFER = 4096  # Kernel send buffer per client
+UNSENT_LIMIT = 512  # Unsent bytes the kernel takes per client before the queue backs up (Linux)
+
+
+def parse_address(text):
+    """Parse ``"HOST:PORT"`` (either part may be left out) into (host, port)."""
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1"), int(port or DEFAULT_PORT)
+
+
+def encode_message(seq, values, full=False):
+    """Encode one message; non-finite values are sent as null."""
+    values = {name: value if math.isfinite(value) else None for name, value in values.items()}
+    message = {"seq": seq, "time": round(time.monotonic(), 3), "full": full, "values": values}
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def unchanged(old, new):
+    """Whether ``new`` repeats ``old``; an undefined (NaN) value repeats NaN."""
+    return old == new or (old is not None and math.isnan(old) and math.isnan(new))
+
+
+class StreamClient:
+    """One connected monitor: its send queue, rate and counters."""
+
+    def __init__(self, writer, queue_size, interval):
+        self.writer = writer
+        self.peer = writer.get_extra_info("peername")
+        self.queue = asyncio.Queue(queue_size)
+        # Keep little in the socket buffers so a slow client backs up into its queue,
+        # where stale deltas are replaced by a fresh snapshot
+        sock = writer.get_extra_info("socket")
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        if hasattr(socket, "TCP_NOTSENT_LOWAT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, UNSENT_LIMIT)
+        writer.transport.set_write_buffer_limits(high=0)
+        self.interval = interval
+        self.next_due = 0.0
+        self.pending = None  # Changes merged while not due (None: in step with the broadcast)
+        self.sent = 0
+        self.dropped = 0  # Messages discarded because the client was too slow
+        self.handler = None  # Task serving the connection
+
+
+class TelemetryServer(threading.Thread):
+    """Serve the latest telemetry to any number of TCP clients.
+
+    ``interval`` is the fastest snapshot rate (seconds between messages);
+    ``queue_size`` bounds the messages waiting for each client and
+    ``max_lag`` (seconds) how long they may wait before the client is resynced.
+    ``start()`` returns at once; ``ready`` is set once the port is bound and
+    ``address`` holds the bound (host, port).
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, interval=0.1, queue_size=8, max_lag=1.0,
+                 name="TelemetryServer"):
+        super(TelemetryServer, self).__init__(name=name, daemon=True)
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self.ready = threading.Event()
+        self.address = None
+        self.error = None
+        self.clients = set()
+        self.seq = 0
+        self.connections = 0
+        self.dropped = 0  # Messages discarded for slow clients, all clients together
+        self._values = {}  # Everything sent so far, the full snapshot
+        self._changes = {}  # Published since the last snapshot
+        self._lock = threading.Lock()
+        self._loop = None
+        self._stopping = None
+
+    # Called from the UI thread
+
+    def publish(self, records):
+        """Remember the newest values of ``records`` for the next snapshot; never blocks."""
+        values = latest_values(records)
+        with self._lock:
+            self._changes.update(values)
+
+    def stop(self):
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    # Server thread
+
+    def run(self):
+        try:
+            asyncio.run(self._serve())
+        except OSError as e:
+            print(f"Telemetry server could not listen on {self.host}:{self.port}: {e}")
+            self.error = e
+            self.ready.set()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.address = server.sockets[0].getsockname()[:2]
+        self.ready.set()
+        ticker = asyncio.create_task(self._broadcast())
+        async with server:
+            await self._stopping.wait()
+            ticker.cancel()
+            handlers = [client.handler for client in self.clients]
+            for client in list(self.clients):
+                client.writer.close()  # Their readers see the end of the stream
+            if handlers:
+                await asyncio.wait(handlers, timeout=1.0)
+
+    async def _broadcast(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            with self._lock:
+                changes, self._changes = self._changes, {}
+            changes = {name: value for name, value in changes.items()
+                       if not unchanged(self._values.get(name), value)}
+            if not changes:
+                continue
+            self._values.update(changes)
+            self.seq += 1
+            now = time.monotonic()
+            message = encode_message(self.seq, changes)  # Shared by every client in step
+            for client in list(self.clients):
+                if now < client.next_due:
+                    client.pending = dict(changes) if client.pending is None else {**client.pending, **changes}
+                    continue
+                if client.pending is not None:
+                    client.pending.update(changes)
+                    self._send(client, encode_message(self.seq, client.pending))
+                    client.pending = None
+                else:
+                    self._send(client, message)
+                client.next_due = now + client.interval
+
+    def _send(self, client, message):
+        try:
+            client.queue.put_nowait((time.monotonic(), message))
+        except asyncio.QueueFull:
+            # Too slow: replace the backlog with one snapshot of everything
+            self._drop_queued(client)
+            client.queue.put_nowait((time.monotonic(), encode_message(self.seq, self._values, full=True)))
+
+    def _drop_queued(self, client):
+        while not client.queue.empty():
+            client.queue.get_nowait()
+            client.dropped += 1
+            self.dropped += 1
+
+    async def _handle_client(self, reader, writer):
+        client = StreamClient(writer, self.queue_size, self.interval)
+        client.handler = asyncio.current_task()
+        self.clients.add(client)
+        self.connections += 1
+        client.queue.put_nowait((time.monotonic(), encode_message(self.seq, self._values, full=True)))
+        sender = asyncio.create_task(self._send_queued(client))
+        try:
+            await self._read_requests(client, reader)
+        except (ConnectionError, OSError):
+            pass
+        except ValueError:
+            pass  # A request line longer than the reader's limit; drop the client
+        finally:
+            sender.cancel()
+            self.clients.discard(client)
+            writer.close()
+
+    async def _send_queued(self, client):
+        try:
+            while True:
+                queued_at, message = await client.queue.get()
+                if time.monotonic() - queued_at > self.max_lag:
+                    # Lagging: skip this and the rest of the backlog, resync with everything
+                    client.dropped += 1
+                    self.dropped += 1
+                    self._drop_queued(client)
+                    message = encode_message(self.seq, self._values, full=True)
+                client.writer.write(message)
+                await client.writer.drain()
+                client.sent += 1
+        except (ConnectionError, OSError):
+            pass  # The reader sees the connection end too
+
+    async def _read_requests(self, client, reader):
+        """Apply ``{"interval": seconds}`` requests until the client disconnects."""
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                interval = float(json.loads(line)["interval"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            client.interval = max(self.interval, interval)
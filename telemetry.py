@@ -0,0 +1,198 @@
+"""Parsers for the text protocols spoken by the sensor and blood pump Arduinos.
+
+A parsed record is a dict mapping channel names (the MainPage attribute
+names) to float values.
+"""
+
+# Command prefixes understood by the blood pump Arduino
+PUMP_SPEED_COMMAND = 'M'  # Routed to the MCP4725 at 0x63
+AIR_FLOW_COMMAND = 'F'  # Routed to the MCP4725 at 0x62
+
+# The pump Arduino confirms each command with ``ACK:<prefix>``
+ACK_PREFIX = 'ACK:'
+
+# Firmware with a synchronized clock (see clock_sync.py) answers ``SYNC:<n>``
+# with ``SYNC:<n>,<millis>`` and may stamp telemetry lines as ``@<millis>;<line>``
+SYNC_PREFIX = 'SYNC:'
+TIME_PREFIX = '@'
+TIME_SEPARATOR = ';'
+
+# Field order of the sensor Arduino CSV line
+SENSOR_FIELDS = (
+    "oxygen_saturation_inlet",
+    "temperature1",
+    "oxygen_saturation_outlet",
+    "temperature2",
+    "oxygen_concentration",
+    "co2_outlet",
+)
+
+# Keys of the pressure transducer board's ``PIN:<mmHg>,POUT:<mmHg>`` lines
+PRESSURE_KEYS = {
+    "PIN": "pressure_inlet",  # Drainage (venous) line, usually negative
+    "POUT": "pressure_outlet",  # After the oxygenator
+}
+
+# Older single-board firmware appends the blood flow rate to the CSV line
+LEGACY_SENSOR_FIELDS = SENSOR_FIELDS + ("blood_flow_rate",)
+
+
+def parse_sensor_line(line, fields=SENSOR_FIELDS):
+    """Parse one CSV sensor line, or return None if it is too short."""
+    values = line.split(',')
+    if len(values) < len(fields):  # Ensure there are enough values
+        return None
+    return {name: float(value) for name, value in zip(fields, values)}
+
+
+def parse_legacy_sensor_line(line):
+    """Parse a CSV sensor line that includes the blood flow rate."""
+    return parse_sensor_line(line, LEGACY_SENSOR_FIELDS)
+
+
+def parse_pump_line(line):
+    """Parse a ``BFR:<value>`` blood flow line from the pump Arduino."""
+    if not line.startswith('BFR:'):
+        return None
+    parts = line.split(':')
+    if len(parts) < 2:  # We need at least two elements: 'BFR' and the value
+        print("Invalid blood pump value format.")
+        return None
+    return {"blood_flow_rate": float(parts[1])}
+
+
+def parse_named_line(line, keys):
+    """Parse a ``KEY:value,KEY:value`` line, keeping the ``keys`` mapped to channel names."""
+    record = {}
+    for item in line.split(','):
+        key, _, value = item.partition(':')
+        name = keys.get(key.strip())
+        if name is not None:
+            record[name] = float(value)
+    return record or None
+
+
+def parse_pressure_line(line):
+    """Parse a ``PIN:<mmHg>,POUT:<mmHg>`` line from a pressure transducer board."""
+    return parse_named_line(line, PRESSURE_KEYS)
+
+
+def format_sensor_line(record, fields=SENSOR_FIELDS):
+    """Format a record the way the sensor Arduino prints it."""
+    return ",".join(f"{record[name]:.2f}" for name in fields) + "\n"
+
+
+def format_pump_line(record):
+    """Format a blood flow record the way the pump Arduino prints it."""
+    return f"BFR:{record['blood_flow_rate']:.2f}\n"
+
+
+def format_named_line(record, keys):
+    """Format a record as ``KEY:value,...`` using the ``keys`` of its channels."""
+    return ",".join(f"{key}:{record[name]:.2f}" for key, name in keys.items() if name in record) + "\n"
+
+
+class LineFramer:
+    """Split a byte stream into complete lines, keeping the partial tail."""
+
+    def __init__(self, max_line=4096):
+        self.max_line = max_line
+        self._tail = b""
+        self._skip_partial = False
+
+    def feed(self, data):
+        """Add bytes and return the list of complete, decoded, non-empty lines."""
+        if self._skip_partial:
+            index = data.find(b"\n")
+            if index < 0:
+                return []
+            data = data[index + 1:]
+            self._skip_partial = False
+        chunks = (self._tail + data).split(b"\n")
+        self._tail = chunks.pop()
+        if len(self._tail) > self.max_line:
+            # No newline for a long time, the stream is garbage; resync
+            self._tail = b""
+        lines = []
+        for chunk in chunks:
+            line = chunk.decode('utf-8', errors='replace').strip()
+            if line:
+                lines.append(line)
+        return lines
+
+    def reset(self):
+        self._tail = b""
+        self._skip_partial = False
+
+    def resync(self):
+        """Drop everything up to the next newline, e.g. after reconnecting mid-line."""
+        self._tail = b""
+        self._skip_partial = True
+
+
+class TextCodec:
+    """The original newline-terminated ASCII protocol.
+
+    ``parser`` turns one line into a record dict, returns None to skip the
+    line, or raises ValueError on malformed data. ``ACK:<prefix>`` lines are
+    passed to ``on_ack`` and ``SYNC:<n>,<millis>`` replies to
+    ``on_sync(n, millis)`` instead. After each ``feed``, ``device_times``
+    holds the ``@<millis>;`` stamp of every record returned (None for an
+    unstamped line).
+    """
+
+    name = "text"
+
+    def __init__(self, parser, on_ack=None, on_sync=None):
+        self.parser = parser
+        self.on_ack = on_ack
+        self.on_sync = on_sync
+        self.framer = LineFramer()
+        self.device_times = []
+
+    def feed(self, data):
+        """Add received bytes and return the list of complete records."""
+        records = []
+        device_times = self.device_times = []
+        for line in self.framer.feed(data):
+            if line.startswith(ACK_PREFIX):
+                if self.on_ack is not None:
+                    self.on_ack(line[len(ACK_PREFIX):])
+                continue
+            try:
+                if line.startswith(SYNC_PREFIX):
+                    if self.on_sync is not None:
+                        seq, millis = line[len(SYNC_PREFIX):].split(',')
+                        self.on_sync(int(seq), int(millis))
+                    continue
+                device_time = None
+                if line.startswith(TIME_PREFIX):
+                    stamp, _, line = line[len(TIME_PREFIX):].partition(TIME_SEPARATOR)
+                    device_time = int(stamp)
+                record = self.parser(line)
+            except (ValueError, IndexError) as e:
+                print(f"Error parsing data: {e}")
+                continue
+            if record is not None:
+                records.append(record)
+                device_times.append(device_time)
+        return records
+
+    def encode_command(self, prefix, value):
+        """Encode a setpoint command such as ``M:1500``."""
+        return f"{prefix}:{value}\n".encode('utf-8')
+
+    def reset(self):
+        self.framer.reset()
+
+    def resync(self):
+        """Start again at the next complete line."""
+        self.framer.resync()
+
+
+def latest_values(records):
+    """Collapse a batch of records into the newest value of each channel."""
+    latest = {}
+    for record in records:
+        latest.update(record)
+    return latest
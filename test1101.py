@@ -1,288 +1,445 @@
+from startup import StartupTimer, lazy_import
+STARTUP = StartupTimer()  # Started before Kivy and everything else is imported
 from kivy.app import App
-from kivy.uix.gridlayout import GridLayout
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.label import Label
-from kivy.uix.button import Button
 from kivy.clock import Clock
-import serial
+import functools
+import os
+import time
+from telemetry import TextCodec, latest_values
+from binary_protocol import negotiate_binary
+from bus import EventBus
+from devices import DeviceSpec, BINARY_KINDS, load_devices
+from io_loop import SerialIOLoop, DeviceLink
+from command_scheduler import CommandScheduler
+from dsp import SignalProcessor, DEFAULT_FILTERS
+from dashboard import Dashboard, CHANNELS, DERIVED_CHANNELS, INLET_TREND_COLOR
+from derived import DerivedMetrics, DEFAULT_METRICS, channel_inputs
+from ports import PortOpener, parse_usb_ids
+from clock_sync import ClockSync
+from profiling import PROFILER
+# NumPy-backed modules only load when first used, after the first frame
+history = lazy_import("history")
+trend = lazy_import("trend")
+recorder = lazy_import("recorder")
+alarms = lazy_import("alarms")
+transport = lazy_import("transport")
+stream_server = lazy_import("stream_server")
+debug_overlay = lazy_import("debug_overlay")
 from kivy.core.window import Window
 # Set the window to full screen
 # Window.fullscreen = 'auto'
 
-class MainPage(GridLayout):
-    def __init__(self, **kwargs):
+# Where telemetry comes from: "serial" for the Arduinos, "replay" to play back
+# ECMO_REPLAY (a recorded session) ECMO_SPEED times faster, or "sim" for
+# synthetic signals at ECMO_RATE samples per second
+TRANSPORT = os.environ.get("ECMO_TRANSPORT", "serial")
+REPLAY_PATH = os.environ.get("ECMO_REPLAY")
+REPLAY_SPEED = float(os.environ.get("ECMO_SPEED", "1"))
+SIM_RATE = float(os.environ.get("ECMO_RATE", "1"))
+
+# Boards read by the I/O loop (see devices.py). ECMO_DEVICES names a JSON file
+# listing them; by default the sensor and pump Arduinos. Serial ports are opened
+# in the background at each board's usual device path. A board whose USB
+# vendor:product id (ECMO_SENSOR_USB / ECMO_PUMP_USB, e.g. "2341:0043") or serial
+# number (ECMO_SENSOR_SERIAL / ECMO_PUMP_SERIAL) differs from the other's is also
+# looked up by it, wherever it enumerates. Set ECMO_CLOCK_SYNC=1 once both boards run
+# firmware that timestamps its samples (see clock_sync.py); in a devices file
+# set "clock_sync" per board
+CLOCK_SYNC = bool(os.environ.get("ECMO_CLOCK_SYNC"))
+if "ECMO_DEVICES" in os.environ:
+    DEVICES = load_devices(os.environ["ECMO_DEVICES"])
+else:
+    DEVICES = (
+        DeviceSpec("sensor", "sensor", '/dev/ttyACM1', baudrate=9600, clock_sync=CLOCK_SYNC,
+                   usb_ids=parse_usb_ids(os.environ.get("ECMO_SENSOR_USB", "")),
+                   serial_number=os.environ.get("ECMO_SENSOR_SERIAL")),
+        DeviceSpec("pump", "pump", '/dev/ttyACM0', baudrate=115200, commands=True, clock_sync=CLOCK_SYNC,
+                   usb_ids=parse_usb_ids(os.environ.get("ECMO_PUMP_USB", "")),
+                   serial_number=os.environ.get("ECMO_PUMP_SERIAL")),
+    )
+CONNECTING_TEXT = "connecting"  # Shown on a board's panels until its first values
+RECONNECTING_TEXT = "reconnecting"  # Shown instead of stale values while a board is away
+
+# Startup milestones are printed; set ECMO_STARTUP_REPORT to also save them as JSON
+STARTUP_REPORT = os.environ.get("ECMO_STARTUP_REPORT")
+
+# "text" keeps the original CSV / BFR: protocol, "auto" asks the firmware for
+# binary framing first and falls back to text if it does not acknowledge
+PROTOCOL = "text"
+
+# Pump commands: at most one per COMMAND_INTERVAL seconds, each waiting up to
+# COMMAND_ACK_TIMEOUT for the firmware's ACK line (None: do not wait)
+COMMAND_INTERVAL = 0.05
+COMMAND_ACK_TIMEOUT = 0.5
+
+# Seconds of history shown by the trend lines behind the panels
+TREND_WINDOW = 600
+
+# Every run is recorded here, see recorder.SessionLog for reading it back
+SESSION_DIR = "sessions"
+
+# Alarms are checked after every batch of records and at least this often (seconds)
+ALARM_INTERVAL = 0.25
+ALARM_IDLE_COLOR = [1, 0, 0, 1]
+ALARM_SHOWN_COLOR = [1, 0.8, 0, 1]
+
+# Streaming filters per channel (see dsp.py) between parsing and display. The
+# history, trends and alarms use the filtered values; raw samples are kept
+# in the history as RAW_PREFIX + channel and both streams are recorded
+SIGNAL_FILTERS = DEFAULT_FILTERS
+RAW_PREFIX = "raw:"
+
+# Metrics computed from the filtered channels as they change (see derived.py);
+# they are shown on the DERIVED_CHANNELS panels, kept in the history and recorded
+DERIVED_METRICS = DEFAULT_METRICS
+
+# Set ECMO_STREAM to HOST:PORT (e.g. "0.0.0.0:8765" for the LAN) to stream the
+# displayed values to remote monitors, see stream_server.py and stream_client.py.
+# Clients get at most one update per STREAM_INTERVAL seconds
+STREAM_ADDRESS = os.environ.get("ECMO_STREAM")
+STREAM_INTERVAL = float(os.environ.get("ECMO_STREAM_INTERVAL", "0.1"))
+
+# Holding the Setup button this long (seconds) opens the profiling overlay (see
+# profiling.py); ECMO_PROFILE=1 profiles from the start. Exports go to SESSION_DIR
+PROFILE_HOLD = 2.0
+
+class MainPage(Dashboard):
+    def __init__(self, connections=None, **kwargs):
+        kwargs.setdefault("channels", CHANNELS + DERIVED_CHANNELS)
         super(MainPage, self).__init__(**kwargs)
-        self.cols = 2
-        self.spacing = 5
-        self.padding = [10, 10, 10, 10]
-        
-        # Establish serial communication with Arduino
-       # Set up serial connections
-        self.serial_connection_sensor = serial.Serial('/dev/ttyACM1', baudrate=9600, timeout=1)  # Sensor connection
-        self.serial_connection_blood_pump = serial.Serial('/dev/ttyACM0', baudrate=115200, timeout=1)  # Blood Pump connection
-
-        # Initialize active module tracker and values
-        self.active_module = None
-        self.blood_pump_value = 0.0
-        self.o2_flow_value = 0.0
-        self.air_flow_value = 0.0
-        self.oxygen_saturation_inlet = 0.0
-        self.temperature1 = 0.0
-        self.oxygen_saturation_outlet = 0.0
-        self.temperature2 = 0.0
-        self.oxygen_concentration = 0.0
-        self.co2_outlet = 0.0  # CO2 outlet value
-        self.blood_flow_rate = 0.0  # Blood flow rate
-        
-        # Left Column: Main Dashboard
-        dashboard_layout = GridLayout(cols=1)
-
-        # Top Row: Battery and Time
-        top_row = BoxLayout(size_hint_y=None, height=50, spacing=10)
-        battery_label = Label(text="[b]Battery[/b]", markup=True, size_hint_x=0.7, halign="left", valign="middle")
-        time_label = Label(text="Date: 10/25/2024  Time: 4:45PM", size_hint_x=0.3, halign="right", valign="middle")
-        top_row.add_widget(battery_label)
-        top_row.add_widget(time_label)
-        dashboard_layout.add_widget(top_row)
-
-        # Data Panels (4x3 grid)
-        self.data_grid = GridLayout(cols=3, spacing=10, padding=[0, 10, 0, 10])
-
-        # Create individual data panels
-        self.blood_pump_panel = self.create_data_panel("Rotation Speed", str(self.blood_pump_value), "RPM", "Blood Pump")
-        self.o2_flow_panel = self.create_data_panel("O2 Flow Rate", f"{self.o2_flow_value:.1f}", "LPM", "O2 Flow Rate")
-        self.air_flow_panel = self.create_data_panel("Air Flow", f"{self.air_flow_value:.1f}", "LPM", "Air Flow")
-
-        # Adding panels to the data grid
-        self.data_grid.add_widget(self.blood_pump_panel)
-        self.data_grid.add_widget(self.create_data_panel("Blood Flow", "0", "LPM"))
-        self.data_grid.add_widget(self.create_pressure_panel())  # Pressure
-
-        self.data_grid.add_widget(self.o2_flow_panel)
-        self.oxygen_concentration_panel = self.create_data_panel("O2 Concentration", "0.0", "Percent (%)")
-        self.data_grid.add_widget(self.oxygen_concentration_panel)  # O2 Concentration
-        self.data_grid.add_widget(self.create_o2_saturation_panel())  # O2 Saturation
-
-        self.data_grid.add_widget(self.air_flow_panel)
-        self.data_grid.add_widget(self.create_data_panel("CO2 Outlet", "0.0", "Percent (%)"))
-        self.data_grid.add_widget(self.create_temperature_panel())  # Temperature
-
-        dashboard_layout.add_widget(self.data_grid)
-        
-        # Bottom Row: Control Buttons (Alarm, Lock, Setup, Main Page)
-        control_buttons = BoxLayout(size_hint_y=None, height=50, spacing=10)
-        alarm_button = Button(text="Alarm", background_color=[1, 0, 0, 1])
-        lock_button = Button(text="Lock", background_color=[0, 0, 0, 1])
-        setup_button = Button(text="Setup", background_color=[0.5, 0.5, 0.5, 1])
-        main_page_button = Button(text="Main Page", background_color=[0.5, 0.5, 1, 1])
-        control_buttons.add_widget(alarm_button)
-        control_buttons.add_widget(lock_button)
-        control_buttons.add_widget(setup_button)
-        control_buttons.add_widget(main_page_button)
-        dashboard_layout.add_widget(control_buttons)
-
-        # Add the dashboard layout to the main grid
-        self.add_widget(dashboard_layout)
-
-        # Right Column: Plus and Minus Buttons
-        self.plus_button = Button(text="+", size_hint_y=0.5, font_size=32)
-        self.plus_button.bind(on_press=self.increase_values)
-        self.minus_button = Button(text="-", size_hint_y=0.5, font_size=32)
-        self.minus_button.bind(on_press=self.decrease_values)
-
-        # Layout for the control buttons
-        button_layout = BoxLayout(orientation="vertical", size_hint_x=0.083)
-        button_layout.add_widget(self.plus_button)
-        button_layout.add_widget(self.minus_button)
-        self.add_widget(button_layout)
-
-        # Disable buttons by default
-        self.plus_button.disabled = True
-        self.minus_button.disabled = True
-
-        # Schedule the update method to run periodically
-        Clock.schedule_interval(self.update_from_serial, 1)  # Update every second
-
-    def create_data_panel(self, title, value, unit, module_name=None):
-        """Helper to create data panel with a title, value, and unit, optionally binding it to a module."""
-        panel = BoxLayout(orientation="vertical", padding=[5, 5, 5, 5], spacing=5)
-        panel.add_widget(Label(text=title, font_size=16, halign="center"))
-
-        # Value label that will be dynamically updated
-        value_label = Label(text=value, font_size=32, halign="center", bold=True)
-        panel.add_widget(value_label)
-        panel.add_widget(Label(text=unit, font_size=16, halign="center"))
-
-        # If this panel corresponds to a module, bind it for touch interactions
-        if module_name:
-            panel.bind(on_touch_down=self.on_module_touch)
-            panel.module_name = module_name
-            panel.value_label = value_label
-
-        return panel
-
-    def create_pressure_panel(self):
-        """Special panel for Inlet/Outlet pressure."""
-        panel = BoxLayout(orientation="vertical", padding=[5, 5, 5, 5], spacing=5)
-        panel.add_widget(Label(text="Pressure", font_size=16, halign="center"))
-        pressure_layout = BoxLayout(orientation="horizontal")
-        pressure_layout.add_widget(Label(text="Inlet\n0.0", halign="center"))
-        pressure_layout.add_widget(Label(text="Outlet\n0.0", halign="center"))
-        panel.add_widget(pressure_layout)
-        panel.add_widget(Label(text="mmHg", font_size=16, halign="center"))
-        return panel
-
-    def create_o2_saturation_panel(self):
-        """Special panel for Inlet/Outlet O2 Saturation."""
-        panel = BoxLayout(orientation="vertical", padding=[5, 5, 5, 5], spacing=5)
-        panel.add_widget(Label(text="O2 Saturation", font_size=16, halign="center"))
-        saturation_layout = BoxLayout(orientation="horizontal")
-        
-        # Store references to the inlet and outlet labels for dynamic updating
-        self.o2_inlet_label = Label(text="Inlet\n0.0", halign="center")
-        self.o2_outlet_label = Label(text="Outlet\n0.0", halign="center")
-        saturation_layout.add_widget(self.o2_inlet_label)
-        saturation_layout.add_widget(self.o2_outlet_label)
-        panel.add_widget(saturation_layout)
-        panel.add_widget(Label(text="Percent (%)", font_size=16, halign="center"))
-        return panel
-
-    def create_temperature_panel(self):
-        """Special panel for Inlet/Outlet Temperature."""
-        panel = BoxLayout(orientation="vertical", padding=[5, 5, 5, 5], spacing=5)
-        panel.add_widget(Label(text="Temperature", font_size=16, halign="center"))
-        temp_layout = BoxLayout(orientation="horizontal")
-        
-        # Store references to the inlet and outlet temperature labels
-        self.temp_inlet_label = Label(text="Inlet\n0.0", halign="center")
-        self.temp_outlet_label = Label(text="Outlet\n0.0", halign="center")
-        temp_layout.add_widget(self.temp_inlet_label)
-        temp_layout.add_widget(self.temp_outlet_label)
-        panel.add_widget(temp_layout)
-        panel.add_widget(Label(text="\u00b0C", font_size=16, halign="center"))
-        return panel
+        STARTUP.mark("dashboard built")
+        self.started = False
+        self.latest = {}  # Newest filtered value of every channel, including ones without a panel
+        self.stream_server = None
+        self.away = set()  # Boards not connected right now; their values and those derived from them are stale
+        boards = {channel: spec.name for spec in DEVICES for channel in spec.channels}
+        self.sources.update({channel: {board} for channel, board in boards.items()})
+        for name, inputs in channel_inputs(DERIVED_METRICS).items():
+            self.sources[name] = {boards[channel] for channel in inputs if channel in boards}
+
+        self.alarm_button.bind(on_press=self.acknowledge_alarms)
+        self.setup_button.bind(on_press=self.setup_pressed, on_release=self.setup_released)
+        self._setup_pressed_at = None
+        self.profiler_overlay = None
+        self.signal_processor = SignalProcessor(SIGNAL_FILTERS)
+
+        # Setpoints go out through one coalescing, rate-limited queue instead of blocking writes
+        self.command_scheduler = CommandScheduler(None, self.encode_pump_command,
+                                                  min_interval=COMMAND_INTERVAL, ack_timeout=COMMAND_ACK_TIMEOUT)
+
+        # One I/O thread reads every board and publishes its records on the bus; the UI
+        # is only woken when new records arrive. Ports are opened in the background so
+        # the dashboard draws right away. Connections (device name -> connection) can
+        # also be passed in, e.g. by benchmarks
+        connections = connections or {}
+        self.bus = EventBus(on_publish=self.schedule_update)
+        self.io_loop = SerialIOLoop(self.bus)
+        self.command_link = None
+        for spec in DEVICES:
+            link = self.device_link(spec)
+            if spec.commands:
+                self.command_link = link
+            if spec.name not in connections:
+                self.away.add(spec.name)
+                self.show_placeholder(spec.name, CONNECTING_TEXT)
+            self.io_loop.add(link, connections.get(spec.name))
+        # Panels of boards missing from DEVICES (e.g. the pressure board) have nothing to show yet either
+        for board in set().union(*self.sources.values()) - {spec.name for spec in DEVICES}:
+            self.away.add(board)
+            self.show_placeholder(board, CONNECTING_TEXT)
+        self.io_loop.start()
+        self.command_scheduler.start()
+
+        # Everything else starts after the first frame, which is drawn between these two ticks
+        Clock.schedule_once(lambda dt: Clock.schedule_once(self.start))
+
+    def device_link(self, spec):
+        """Return the I/O loop link of one board: its opener, codec and callbacks."""
+        on_ack = self.command_scheduler.acknowledge if spec.commands else None
+        negotiate = None
+        if PROTOCOL == "auto" and spec.kind in BINARY_KINDS:
+            negotiate = functools.partial(negotiate_binary, on_ack=on_ack)
+        parser = PROFILER.timed("parse", spec.parser)
+        clock = ClockSync() if spec.clock_sync else None
+        codec = TextCodec(parser, on_ack=on_ack, on_sync=clock.reply if clock is not None else None)
+        return DeviceLink(spec, codec, opener=self.port_opener(spec), negotiate=negotiate, clock=clock,
+                          on_connect=functools.partial(self.board_connected, spec),
+                          on_disconnect=functools.partial(self.board_disconnected, spec))
+
+    def port_opener(self, spec):
+        """Return the callable the I/O loop uses to open one board's connection."""
+        if TRANSPORT == "serial":
+            return PortOpener(spec.port, spec.usb_ids, baudrate=spec.baudrate, timeout=1,
+                              name=f"{spec.name} board", serial_number=spec.serial_number)
+        return lambda stop_event: transport.open_transport(TRANSPORT, spec.kind, spec.port, baudrate=spec.baudrate,
+                                                           timeout=1, replay_path=REPLAY_PATH, speed=REPLAY_SPEED,
+                                                           rate=SIM_RATE, timestamps=spec.clock_sync)
+
+    def board_connected(self, spec, connection):
+        """Called off the UI thread once a port is open, again after every reconnect."""
+        STARTUP.mark(f"{spec.name} board connected")
+        if spec.commands:
+            # Written through the link, which keeps commands and clock pings apart
+            self.command_scheduler.set_connection(self.command_link)
+            # A reset Arduino has forgotten the setpoints; send the last ones again
+            self.command_scheduler.resend_all()
+        Clock.schedule_once(functools.partial(self.link_changed, spec.name, True))
+
+    def board_disconnected(self, spec):
+        """Called on the I/O thread when a port failed; it is reopened with backoff."""
+        print(f"Lost the {spec.name} board, reconnecting")
+        if spec.commands:
+            self.command_scheduler.set_connection(None)
+        Clock.schedule_once(functools.partial(self.link_changed, spec.name, False))
+
+    def link_changed(self, kind, connected, dt=None):
+        """Mark a board's values stale while it is away and record its link state for the alarms."""
+        if connected:
+            self.away.discard(kind)
+            if self.started:
+                # The board's own panels wait for its next values; derived values may not change with them
+                self.display.update({name: value for name, value in self.latest.items()
+                                     if name in self.derived.metrics and not self.is_stale(name)})
+        else:
+            self.away.add(kind)
+            self.show_placeholder(kind, RECONNECTING_TEXT)
+        if self.started:
+            self.record_link(kind, connected)
+            self.check_alarms()
+
+    def record_link(self, kind, connected):
+        record = {f"link:{kind}": 1.0 if connected else 0.0}
+        self.history.consume([record])
+        self.recorder.record([record])
+
+    def is_stale(self, name):
+        """Whether a channel's value comes from a board that is away."""
+        return not self.away.isdisjoint(self.sources.get(name, ()))
+
+    def start(self, dt=None):
+        """Load the history, trends, recorder and alarms and start consuming records."""
+        if self.started:
+            return
+        self.started = True
+        STARTUP.mark("first frame")
+
+        # Trend history of every telemetry channel for the whole run, drawn behind the panels
+        self.history = history.TelemetryHistory([channel for spec in DEVICES for channel in spec.channels])
+        self.trends = []
+        for channel in self.channels:
+            if channel.trend:
+                self.add_trend(self.panels[channel.panel], channel.field, channel.trend)
+
+        self.recorder = recorder.SessionRecorder(recorder.session_path(SESSION_DIR))
+        self.recorder.start()
+        # Every parsed (raw) record is kept and recorded at its sample time; the display filters them first
+        self.bus.subscribe(functools.partial(self.history.consume, prefix=RAW_PREFIX), timestamps=True)
+        self.bus.subscribe(self.recorder.record, timestamps=True)
+        self.bus.subscribe(self.show_records, timestamps=True)
+        self.filtered_consumers = []  # Callables that receive the filtered records and their times
+        self.filtered_consumers.append(self.history.consume)
+        self.filtered_consumers.append(functools.partial(self.recorder.record, kind=recorder.FILTERED))
+        self.derived = DerivedMetrics(DERIVED_METRICS)
+        self.derived.update({channel.field: getattr(self, channel.field) for channel in self.setpoints.values()},
+                            time.monotonic())
+        self.derived_consumers = []  # Callables that receive the changed derived metrics
+        self.derived_consumers.append(self.history.consume)
+        self.derived_consumers.append(functools.partial(self.recorder.record, kind=recorder.DERIVED))
+        if STREAM_ADDRESS:
+            host, port = stream_server.parse_address(STREAM_ADDRESS)
+            self.stream_server = stream_server.TelemetryServer(host, port, interval=STREAM_INTERVAL)
+            self.stream_server.start()
+            self.filtered_consumers.append(lambda records, times: self.stream_server.publish(records))
+            self.derived_consumers.append(self.stream_server.publish)
+
+        # Trend lines only redraw when samples arrive or the window scrolls a pixel
+        self._trend_event = Clock.schedule_interval(self.refresh_trends, 0)
+
+        # Debounce times elapse even when no samples arrive
+        self.alarms = alarms.AlarmEngine(self.history, alarms.DEFAULT_ALARM_RULES)
+        # Boards that have not connected yet must raise "board disconnected" as well
+        for name, link in self.io_loop.links.items():
+            self.record_link(name, link.connected.is_set())
+        self.bus.subscribe(self.check_alarms, channels=self.alarms.channels())
+        self._alarm_event = Clock.schedule_interval(self.check_alarms, ALARM_INTERVAL)
+
+        PROFILER.watch("bus batches", lambda: self.bus.published)
+        PROFILER.watch("bus dropped", lambda: self.bus.dropped)
+        PROFILER.watch("recorder dropped", lambda: self.recorder.dropped)
+        PROFILER.watch("derived evals", lambda: self.derived.evaluations)
+        PROFILER.watch("derived skipped", lambda: self.derived.skipped)
+        PROFILER.watch("disconnects", lambda: sum(link.disconnects for link in self.io_loop.links.values()))
+        if self.stream_server is not None:
+            PROFILER.watch("stream dropped", lambda: self.stream_server.dropped)
+        self._frame_event = None
+        self.set_profiling(PROFILER.enabled)
+        STARTUP.mark("pipeline started")
+
+        # Records that arrived in the meantime are still queued on the bus
+        self.schedule_update()
+
+    def add_trend(self, panel, channel, color=INLET_TREND_COLOR):
+        """Draw a trend line of a history channel behind a panel."""
+        line = trend.TrendLine(self.history.channel(channel), window=TREND_WINDOW, color=color)
+        line.attach(panel)
+        self.trends.append(line)
+
+    def refresh_trends(self, dt):
+        for trend in self.trends:
+            trend.refresh()
 
     def update_from_serial(self, dt):
-        self.flowrate=None   
-        """Read data from serial and update the labels."""
-        try:
-            if self.serial_connection_sensor.in_waiting > 0:
-                data = self.serial_connection_sensor.readline().decode('utf-8').strip()
-                values = data.split(',')
-
-                if len(values) >= 6:  # Ensure there are enough values
-                    self.oxygen_saturation_inlet = float(values[0])
-                    self.temperature1 = float(values[1])
-                    self.oxygen_saturation_outlet = float(values[2])
-                    self.temperature2 = float(values[3])
-                    self.oxygen_concentration = float(values[4])
-                    self.co2_outlet = float(values[5])  # CO2 outlet
-                    # Initialize flowrate variable
-                    
-                if self.serial_connection_blood_pump.in_waiting > 0:
-                    flowrate = self.serial_connection_blood_pump.readline().decode('utf-8').strip()
-                else:
-                    flowrate = None   
-                if flowrate is not None and flowrate.startswith('BFR:'):
-                        # Split the blood_pump_value by ':' and ensure the resulting list has enough elements
-                    parts = flowrate.split(':')
-                     # Check if the length of parts is appropriate
-                    if len(parts) > 1:  # We need at least two elements: 'BFR' and the value
-                        self.blood_flow_rate = float(parts[1])  # Access the correct index (1, not 3)
-                    else:
-                        print("Invalid blood pump value format.")
-                   
-               
-               # Update the labels in the Kivy app
-                    self.update_labels() 
-        except (ValueError, IndexError) as e:
-          print(f"Error parsing data: {e}")
-                   
-    def update_labels(self):
-        """Update all the labels in the Kivy app with the latest values."""
-        self.o2_inlet_label.text = f"Inlet\n{self.oxygen_saturation_inlet:.1f}"  # O2 Saturation Inlet
-        self.temp_inlet_label.text = f"Inlet\n{self.temperature1:.1f}"  # Temperature Inlet
-        self.o2_outlet_label.text = f"Outlet\n{self.oxygen_saturation_outlet:.1f}"  # O2 Saturation Outlet
-        self.temp_outlet_label.text = f"Outlet\n{self.temperature2:.1f}"  # Temperature Outlet
-        self.oxygen_concentration_panel.children[1].text = f"{self.oxygen_concentration:.1f}"  # O2 Concentration
-        self.data_grid.children[1].children[1].text = f"{self.co2_outlet:.2f}"  # CO2 Outlet
-        self.data_grid.children[7].children[1].text = f"{self.blood_flow_rate:.2f}"  # Blood Flow Rat
-    
-    def on_module_touch(self, instance, touch):
-        """Handle touch events to select a module and enable the buttons."""
-        if instance.collide_point(touch.x, touch.y):
-            self.active_module = instance.module_name  # Set the active module
-            self.active_label = instance.value_label  # Reference the label to update
-            self.show_buttons()
-
-    def show_buttons(self):
-        """Enable or disable the '+' and '-' buttons based on active module."""
-        if self.active_module:
-            self.plus_button.disabled = False
-            self.minus_button.disabled = False
+        """Hand the records queued on the bus to their subscribers."""
+        super(MainPage, self).update_from_serial(dt)
+        if not self.started:
+            return  # start() dispatches what was queued
+        if not PROFILER.enabled:
+            self.bus.dispatch()
+            return
+        PROFILER.sample("bus queue", self.bus.pending)
+        start = time.perf_counter()
+        self.bus.dispatch()
+        PROFILER.add_time("dispatch", time.perf_counter() - start)
+
+    def show_records(self, records, times):
+        """Filter new records, keep the filtered stream and show the newest values."""
+        profiling = PROFILER.enabled
+        if profiling:
+            start = time.perf_counter()
+        filtered = self.signal_processor.process(records)
+        if profiling:
+            filtered_at = time.perf_counter()
+            PROFILER.add_time("filter", filtered_at - start)
+        for consumer in self.filtered_consumers:
+            consumer(filtered, times=times)
+        self.apply_values(latest_values(filtered))
+        if profiling:
+            PROFILER.add_time("apply", time.perf_counter() - filtered_at)
+            # From sampling (on the board, with clock sync) to the labels being set
+            shown = time.monotonic()
+            for sampled in times:
+                PROFILER.add_time("sample to UI", shown - sampled)
+        if "first values shown" not in STARTUP.marks:
+            STARTUP.mark("first values shown")
+            print(STARTUP.report())
+
+    def apply_values(self, values):
+        """Show new channel values and the derived metrics that changed with them."""
+        derived = self.derived.update(values, time.monotonic())
+        if derived:
+            for consumer in self.derived_consumers:
+                consumer([derived])
+            values = {**values, **derived}
+        self.latest.update(values)
+        shown = {}
+        for name in values.keys() & self.value_labels.keys():
+            setattr(self, name, values[name])
+            if not self.is_stale(name):
+                shown[name] = values[name]
+
+        # Update the labels in the Kivy app; placeholders stay until their board is back
+        self.display.update(shown)
+
+    def check_alarms(self, *args):
+        """Evaluate the alarm rules, record changes and update the Alarm button.
+
+        Called by the clock, by the bus with new records of the alarm channels
+        and when a board comes or goes.
+        """
+        changed = self.alarms.evaluate()
+        if not changed:
+            return
+        for alarm in changed:
+            print(f"Alarm {alarm.name}: {alarm.state}")
+            self.recorder.record([{f"alarm:{alarm.name}": 1.0 if alarm.state == alarms.ACTIVE else 0.0}],
+                                 kind=recorder.ALARM)
+        self.show_alarms()
+
+    def show_alarms(self):
+        shown = self.alarms.active()
+        if shown:
+            self.alarm_button.text = f"Alarm ({len(shown)})\n{shown[0].name}"
+            self.alarm_button.background_color = ALARM_SHOWN_COLOR
         else:
-            self.plus_button.disabled = True
-            self.minus_button.disabled = True
-
-    def increase_values(self, instance):
-        if  self.active_module == "Blood Pump":
-            self.blood_pump_value += 50  # Example increment
-            self.blood_pump_panel.children[1].text = f"{self.blood_pump_value}"  # Update Blood Pump label
-            # Send the updated pump speed to the Arduino
-            self.send_pump_speed_to_arduino(self.blood_pump_value)  # Send updated speed
-        elif self.active_module == "Air Flow":
-            self.air_flow_value += 0.5  # Example increment
-            self.air_flow_panel.children[1].text = f"{self.air_flow_value:.1f}"  # Update Air Flow
-            self.send_air_flow_to_arduino(self.air_flow_value)  # Send updated speed
-        elif self.active_module == "O2 Flow Rate":
-            self.o2_flow_value += 0.5  # Example increment
-            self.o2_flow_panel.children[1].text = f"{self.o2_flow_value:.1f}"  # Update O2 Flow Rate label
-            
-    def decrease_values(self, instance):
-         if self.active_module == "Blood Pump":
-            self.blood_pump_value -= 50  # Example decrement
-            self.blood_pump_panel.children[1].text = f"{self.blood_pump_value}"  # Update Blood Pump label
-            self.send_pump_speed_to_arduino(self.blood_pump_value)  # Send updated speed
-         elif self.active_module == "Air Flow":
-          if self.air_flow_value > 0:  # Prevent negative values
-            self.air_flow_value -= 0.1  # Example decrement
-            self.air_flow_panel.children[1].text = f"{self.air_flow_value:.1f}"  # Update Air Flow label   
-            self.send_air_flow_to_arduino(self.air_flow_value) # Send updated speed
-         elif self.active_module == "O2 Flow Rate":
-            self.o2_flow_value -= 0.5  # Example decrement
-            self.o2_flow_panel.children[1].text = f"{self.o2_flow_value:.1f}"  # Update O2 Flow Rate label
-    def send_pump_speed_to_arduino(self, pump_speed):
-        try:
-           # Format the pump speed command for the Arduino to control motor speed
-           command = f"M:{pump_speed}\n"  # Prefix 'M:' for motor speed, Arduino will route this to 0x63
-           self.serial_connection_blood_pump.write(command.encode('utf-8'))  # Send data to Arduino
-           self.serial_connection_blood_pump.flush()  # Flush the output buffer to ensure the command is sent
-           print(f"Sent new pump speed: {pump_speed} to MCP4725 at 0x63")  # Log for debugging
-        except Exception as e:
-           print(f"Error sending data to blood pump: {e}")
-    
-    def send_air_flow_to_arduino(self, air_flow_value):
-        try:
-           # Format the air flow command for the Arduino
-           command = f"F:{air_flow_value}\n"  # Prefix 'F:' to specify flow rate command
-           self.serial_connection_blood_pump.write(command.encode('utf-8'))  # Send flow rate data to Arduino
-           self.serial_connection_blood_pump.flush()  # Flush the output buffer to ensure the command is sent
-           rounded_value = round(air_flow_value, 1)  # Round to 1 decimal place
-           print(f"Sent air flow value: {rounded_value} to MCP4725 at 0x62")  # Log for debugging
-        except Exception as e:
-           print(f"Error sending air flow data to Arduino: {e}")
+            self.alarm_button.text = "Alarm"
+            self.alarm_button.background_color = ALARM_IDLE_COLOR
+
+    def acknowledge_alarms(self, instance):
+        """Alarm button: acknowledge everything currently shown."""
+        self.alarms.acknowledge()
+        self.show_alarms()
+
+    def setup_pressed(self, instance):
+        self._setup_pressed_at = time.monotonic()
+
+    def setup_released(self, instance):
+        """A long press on Setup opens the hidden profiling overlay."""
+        pressed_at, self._setup_pressed_at = self._setup_pressed_at, None
+        if pressed_at is None or time.monotonic() - pressed_at < PROFILE_HOLD or not self.started:
+            return
+        if self.profiler_overlay is None:
+            self.profiler_overlay = debug_overlay.ProfilerOverlay(self.set_profiling, self.profile_path)
+        self.profiler_overlay.open()
+
+    def set_profiling(self, enabled):
+        """Start or pause the profiler and the per-frame sampling of frame time and queues."""
+        PROFILER.enabled = enabled
+        if enabled and self._frame_event is None:
+            self._frame_event = Clock.schedule_interval(self.profile_frame, 0)
+        elif not enabled and self._frame_event is not None:
+            self._frame_event.cancel()
+            self._frame_event = None
+
+    def profile_frame(self, dt):
+        PROFILER.add_time("frame", dt)
+        PROFILER.sample("recorder queue", self.recorder.pending)
+
+    def profile_path(self):
+        os.makedirs(SESSION_DIR, exist_ok=True)
+        return os.path.join(SESSION_DIR, time.strftime("profile-%Y%m%d-%H%M%S.json"))
+
+    def setpoint_changed(self, channel):
+        """Show, record and send a setpoint changed from the touchscreen."""
+        super(MainPage, self).setpoint_changed(channel)
+        value = getattr(self, channel.field)
+        if self.started:
+            self.recorder.record_command(channel.field, value)
+            self.apply_values({channel.field: value})
+        if channel.command:
+            self.command_scheduler.submit(channel.command, round(value, 1))
+
+    def encode_pump_command(self, prefix, value):
+        """Encode a command in whatever protocol the pump link negotiated."""
+        return self.command_link.codec.encode_command(prefix, value)
 
     def on_stop(self):
-        self.serial_connection_blood_pump.close()  # Ensure the serial connection is closed when the app stops        
-        """Close serial connections when the app stops."""
-        if self.serial_connection_sensor.is_open:
-            self.serial_connection_sensor.close()
-        if self.serial_connection_blood_pump.is_open:
-            self.serial_connection_blood_pump.close()
+        """Stop the I/O threads and close serial connections when the app stops."""
+        self.io_loop.stop()
+        self.command_scheduler.stop()
+        if self.stream_server is not None:
+            self.stream_server.stop()
+        if self.started:
+            # A page stopped without quitting the app (e.g. in a benchmark) must not keep running
+            self._trend_event.cancel()
+            self._alarm_event.cancel()
+            if self._frame_event is not None:
+                self._frame_event.cancel()
+            self.recorder.close()
+        for link in self.io_loop.links.values():
+            connection = link.connection
+            if connection is not None and connection.is_open:
+                connection.close()
+        if STARTUP_REPORT:
+            STARTUP.write(STARTUP_REPORT)
+        if PROFILER.enabled:
+            print(PROFILER.report())
 
 class MyApp(App):
     def build(self):
         return MainPage()
 
+    def on_stop(self):
+        self.root.on_stop()
+
 if __name__ == "__main__":
     MyApp().run()
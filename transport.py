@@ -0,0 +1,154 @@
+"""Pluggable transports behind the sensor and blood pump connections.
+
+``open_transport`` returns an object with the ``serial.Serial`` interface
+used by the GUI, in one of three modes:
+
+* ``serial``: the real Arduino on a serial port.
+* ``replay``: a recorded session log played back at 1x or N-times speed.
+* ``sim``: a synthetic physiological signal generator at any sample rate.
+
+Replay and simulation run the firmware emulation from ``loopback``, so
+they speak the CSV / ``BFR:`` text protocol or binary framing, accept
+``M:`` / ``F:`` commands, and need no hardware or display.
+"""
+import math
+import random
+import threading
+import time
+
+import numpy as np
+import serial
+
+from loopback import LoopbackArduino
+from recorder import SessionLog, SAMPLE
+from telemetry import SENSOR_FIELDS, PRESSURE_KEYS, PUMP_SPEED_COMMAND
+
+TRANSPORT_MODES = ("serial", "replay", "sim")
+
+# Channels each board reports
+BOARD_CHANNELS = {
+    "sensor": SENSOR_FIELDS,
+    "pump": ("blood_flow_rate",),
+    "pressure": tuple(PRESSURE_KEYS.values()),
+}
+
+
+class StreamingArduino(LoopbackArduino):
+    """Loopback firmware that sends ``(time, record)`` samples on its own thread.
+
+    Sample times are in seconds from the start of the stream and are played
+    back ``speed`` times faster than real time. Samples that fall due in the
+    same wake-up are sent as one burst. ``samples`` may also be a callable
+    that receives the board and returns the samples.
+    """
+
+    def __init__(self, kind, samples, speed=1.0, **kwargs):
+        super(StreamingArduino, self).__init__(kind, **kwargs)
+        self.samples = samples
+        self.speed = speed
+        self.sent = 0
+        self._thread = threading.Thread(target=self._stream, name=f"{kind}-stream", daemon=True)
+        self._thread.start()
+
+    def _stream(self):
+        samples = self.samples(self) if callable(self.samples) else self.samples
+        start = time.monotonic()
+        burst = []
+        for offset, record in samples:
+            if not self.is_open:
+                return
+            delay = start + offset / self.speed - time.monotonic()
+            if delay > 0:
+                if burst:
+                    self.send(*burst)
+                    self.sent += len(burst)
+                    burst = []
+                time.sleep(delay)
+            burst.append(record)
+        if burst and self.is_open:
+            self.send(*burst)
+            self.sent += len(burst)
+
+
+def replay_samples(path, kind):
+    """Yield ``(time, record)`` samples of one board from a session log."""
+    channels = BOARD_CHANNELS[kind]
+    log = SessionLog(path)
+    ids = {log.channels.index(name): name for name in channels if name in log.channels}
+    records = log.records
+    rows = records[(records["kind"] == SAMPLE) & np.isin(records["channel"], list(ids))]
+    if not len(rows):
+        return
+    start = rows["time"][0]
+    record = {}
+    record_time = start
+    for row_time, value, channel_id in zip(rows["time"].tolist(), rows["value"].tolist(),
+                                           rows["channel"].tolist()):
+        name = ids[channel_id]
+        # A repeated channel or a new timestamp starts the next record
+        if record and (name in record or row_time != record_time):
+            if len(record) == len(channels):
+                yield record_time - start, record
+            record = {}
+        record[name] = value
+        record_time = row_time
+    if len(record) == len(channels):
+        yield record_time - start, record
+
+
+def synthetic_samples(kind, rate=1.0, commands=None, seed=None):
+    """Yield an endless stream of plausible ``(time, record)`` samples at ``rate`` Hz.
+
+    For the pump board the blood flow follows the last ``M:`` pump speed in
+    ``commands`` (the list a ``LoopbackArduino`` collects).
+    """
+    rng = random.Random(seed)
+    period = 1.0 / rate
+    index = 0
+    while True:
+        t = index * period
+        breathing = math.sin(2 * math.pi * t / 4.0)  # Slow physiological drift
+        if kind == "sensor":
+            record = {
+                "oxygen_saturation_inlet": 70.0 + 2.0 * breathing + rng.gauss(0, 0.3),
+                "temperature1": 36.6 + 0.1 * math.sin(2 * math.pi * t / 300.0) + rng.gauss(0, 0.02),
+                "oxygen_saturation_outlet": 99.0 + 0.5 * breathing + rng.gauss(0, 0.1),
+                "temperature2": 37.0 + 0.1 * math.sin(2 * math.pi * t / 300.0) + rng.gauss(0, 0.02),
+                "oxygen_concentration": 60.0 + rng.gauss(0, 0.2),
+                "co2_outlet": 4.0 + 0.3 * breathing + rng.gauss(0, 0.05),
+            }
+        elif kind == "pressure":
+            record = {
+                "pressure_inlet": -40.0 + 3.0 * breathing + rng.gauss(0, 1.0),
+                "pressure_outlet": 250.0 + 5.0 * breathing + rng.gauss(0, 2.0),
+            }
+        else:
+            pump_speed = 3000.0
+            for prefix, value in reversed(commands or ()):
+                if prefix == PUMP_SPEED_COMMAND:
+                    pump_speed = value
+                    break
+            # Centrifugal pump, roughly 1.2 LPM per 1000 RPM
+            record = {"blood_flow_rate": max(0.0, pump_speed * 0.0012 + rng.gauss(0, 0.03))}
+        yield t, record
+        index += 1
+
+
+def open_transport(mode, kind, port=None, baudrate=9600, timeout=1, replay_path=None,
+                   speed=1.0, rate=1.0, binary_capable=True, timestamps=False):
+    """Open the connection for one board (``kind`` is a ``BOARD_CHANNELS`` key).
+
+    With ``timestamps`` the emulated replay and sim boards stamp their
+    lines and answer clock pings (see ``clock_sync``).
+    """
+    if mode == "serial":
+        return serial.Serial(port, baudrate=baudrate, timeout=timeout)
+    if mode == "replay":
+        if replay_path is None:
+            raise ValueError("Replay mode needs a session log path")
+        return StreamingArduino(kind, replay_samples(replay_path, kind), speed=speed,
+                                binary_capable=binary_capable, timeout=timeout, timestamps=timestamps)
+    if mode == "sim":
+        return StreamingArduino(kind, lambda board: synthetic_samples(kind, rate, board.commands), speed=speed,
+                                binary_capable=binary_capable, timeout=timeout, timestamps=timestamps)
+    raise ValueError(f"Unknown transport mode {mode!r}, expected one of {TRANSPORT_MODES}")
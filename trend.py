@@ -0,0 +1,111 @@
+"""Strip-chart trend lines drawn behind the dashboard panels.
+
+A ``TrendLine`` is one Kivy ``Line`` instruction fed from a
+``history.ChannelBuffer``. Samples are min/max decimated into one column
+per pixel of the panel width, so the vertex count is bounded by the panel
+size no matter how many hours of samples the window covers. Columns are
+kept between frames and only samples that arrived since the last refresh
+are folded in.
+"""
+import math
+import time
+
+import numpy as np
+from kivy.graphics import Color, InstructionGroup, Line
+
+
+class TrendLine(InstructionGroup):
+    """Min/max decimated trend of one channel over the last ``window`` seconds.
+
+    ``value_range`` fixes the vertical scale as (low, high); by default the
+    line scales to the visible samples.
+    """
+
+    def __init__(self, buffer, window=600, color=(0.3, 0.8, 1, 0.6), value_range=None, **kwargs):
+        super(TrendLine, self).__init__(**kwargs)
+        self.buffer = buffer
+        self.window = window
+        self.value_range = value_range
+        self.add(Color(*color))
+        self.line = Line(points=[], width=1.1)
+        self.add(self.line)
+        self.bounds = (0, 0, 1, 1)
+        self._reset_columns(1)
+
+    def attach(self, widget):
+        """Draw behind ``widget`` and follow its position and size."""
+        widget.canvas.before.add(self)
+        widget.bind(pos=self._on_bounds, size=self._on_bounds)
+        self._on_bounds(widget)
+
+    def _on_bounds(self, widget, *args):
+        self.bounds = (widget.x, widget.y, widget.width, widget.height)
+        self._reset_columns(max(1, int(widget.width)))
+        self.refresh(force=True)
+
+    def _reset_columns(self, columns):
+        self.columns = columns
+        self.column_seconds = self.window / columns
+        self._ids = np.full(columns, -1, dtype=np.int64)  # Absolute column held by each slot
+        self._mins = np.empty(columns)
+        self._maxs = np.empty(columns)
+        self._seen = None  # buffer.total when columns were last updated
+        self._drawn = None  # (newest column, samples seen) of the current points
+
+    def _fold(self, times, values):
+        """Merge samples into their per-pixel min/max columns."""
+        ids = np.floor_divide(times, self.column_seconds).astype(np.int64)
+        if len(ids) and ids[0] <= ids[-1] - self.columns:
+            # Only the newest ``columns`` columns have a slot; older samples would wrap onto them
+            keep = ids > ids[-1] - self.columns
+            ids, values = ids[keep], values[keep]
+        slots = ids % self.columns
+        stale = self._ids[slots] != ids
+        if stale.any():
+            fresh = slots[stale]
+            self._ids[fresh] = ids[stale]
+            self._mins[fresh] = np.inf
+            self._maxs[fresh] = -np.inf
+        np.minimum.at(self._mins, slots, values)
+        np.maximum.at(self._maxs, slots, values)
+
+    def refresh(self, now=None, force=False):
+        """Fold in new samples and update the line if anything changed."""
+        if now is None:
+            now = time.monotonic()
+        total = self.buffer.total
+        if self._seen is None or total - self._seen > self.buffer.count:
+            # First draw, resize, or more new samples than the buffer holds
+            self._ids.fill(-1)
+            self._fold(*self.buffer.window(self.window, now))
+        elif total != self._seen:
+            self._fold(*self.buffer.last(total - self._seen))
+        self._seen = total
+
+        newest = int(math.floor(now / self.column_seconds))
+        if not force and self._drawn == (newest, total):
+            return
+        self._drawn = (newest, total)
+
+        first = newest - self.columns + 1
+        ids = np.arange(first, newest + 1)
+        slots = ids % self.columns
+        visible = self._ids[slots] == ids
+        if not visible.any():
+            self.line.points = []
+            return
+        slots = slots[visible]
+        mins = self._mins[slots]
+        maxs = self._maxs[slots]
+        if self.value_range is not None:
+            low, high = self.value_range
+        else:
+            low, high = mins.min(), maxs.max()
+        span = (high - low) or 1.0
+
+        x, y, width, height = self.bounds
+        points = np.empty((len(slots), 4))
+        points[:, 0] = points[:, 2] = x + (ids[visible] - first) * (width / self.columns)
+        points[:, 1] = y + np.clip((mins - low) / span, 0, 1) * height
+        points[:, 3] = y + np.clip((maxs - low) / span, 0, 1) * height
+        self.line.points = points.ravel().tolist()